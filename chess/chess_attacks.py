@@ -0,0 +1,113 @@
+# Attack tables precomputed at import time, indexed by square (y * 8 + x)
+# Sliding pieces look up their attacks per line, keyed by the occupancy of the squares on that line
+
+ROOK_DIRECTIONS = [[1, 0], [0, 1], [-1, 0], [0, -1]]
+BISHOP_DIRECTIONS = [[1, 1], [1, -1], [-1, 1], [-1, -1]]
+KNIGHT_OFFSETS = [[1, 2], [2, 1], [2, -1], [1, -2], [-1, -2], [-2, -1], [-2, 1], [-1, 2]]
+KING_OFFSETS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+# the two opposite directions that make up each line a slider moves along
+ROOK_LINES = [[[1, 0], [-1, 0]], [[0, 1], [0, -1]]]
+BISHOP_LINES = [[[1, 1], [-1, -1]], [[1, -1], [-1, 1]]]
+
+def offset_attacks(square, offsets):
+	x, y = square & 7, square >> 3
+	attacks = 0
+	for dx, dy in offsets:
+		if 0 <= x + dx <= 7 and 0 <= y + dy <= 7:
+			attacks |= 1 << ((y + dy) * 8 + x + dx)
+	return attacks
+
+# Walks the ray from square in direction (dx,dy), including the first occupied square
+def ray_attacks(square, dx, dy, occupied):
+	x, y = (square & 7) + dx, (square >> 3) + dy
+	attacks = 0
+	while 0 <= x <= 7 and 0 <= y <= 7:
+		bit = 1 << (y * 8 + x)
+		attacks |= bit
+		if occupied & bit:
+			break
+		x, y = x + dx, y + dy
+	return attacks
+
+# Squares of the ray that can block it, the last square of a ray never changes the attacks
+def ray_blocker_mask(square, dx, dy):
+	return ray_attacks(square, dx, dy, 0) & ~edge_square(square, dx, dy)
+
+def edge_square(square, dx, dy):
+	x, y = square & 7, square >> 3
+	edge = 0
+	while 0 <= x + dx <= 7 and 0 <= y + dy <= 7:
+		x, y = x + dx, y + dy
+		edge = 1 << (y * 8 + x)
+	return edge
+
+# Returns (blocker_masks, attack_tables) of one set of lines, attack_tables[square][line] maps blockers to attacks
+def build_line_tables(lines):
+
+	blocker_masks = []
+	attack_tables = []
+	for square in range(64):
+		square_masks = []
+		square_tables = []
+		for line in lines:
+			mask = 0
+			for dx, dy in line:
+				mask |= ray_blocker_mask(square, dx, dy)
+
+			# enumerate every subset of the mask
+			table = {}
+			blockers = 0
+			while True:
+				attacks = 0
+				for dx, dy in line:
+					attacks |= ray_attacks(square, dx, dy, blockers)
+				table[blockers] = attacks
+				blockers = (blockers - mask) & mask
+				if blockers == 0:
+					break
+
+			square_masks.append(mask)
+			square_tables.append(table)
+		blocker_masks.append(square_masks)
+		attack_tables.append(square_tables)
+	return blocker_masks, attack_tables
+
+KNIGHT_ATTACKS = [offset_attacks(square, KNIGHT_OFFSETS) for square in range(64)]
+KING_ATTACKS = [offset_attacks(square, KING_OFFSETS) for square in range(64)]
+
+# PAWN_ATTACKS[color][square] are the squares a pawn of that color on square attacks
+PAWN_ATTACKS = [
+	[offset_attacks(square, [[-1, 1], [1, 1]]) for square in range(64)],
+	[offset_attacks(square, [[-1, -1], [1, -1]]) for square in range(64)],
+]
+
+ROOK_BLOCKER_MASKS, ROOK_ATTACK_TABLES = build_line_tables(ROOK_LINES)
+BISHOP_BLOCKER_MASKS, BISHOP_ATTACK_TABLES = build_line_tables(BISHOP_LINES)
+
+ROOK_EMPTY_ATTACKS = [ROOK_ATTACK_TABLES[square][0][0] | ROOK_ATTACK_TABLES[square][1][0] for square in range(64)]
+BISHOP_EMPTY_ATTACKS = [BISHOP_ATTACK_TABLES[square][0][0] | BISHOP_ATTACK_TABLES[square][1][0] for square in range(64)]
+
+# BETWEEN[a][b] are the squares strictly between two squares on a common line, 0 if they are not aligned
+BETWEEN = [[0] * 64 for square in range(64)]
+for square in range(64):
+	for dx, dy in KING_OFFSETS:
+		between = 0
+		x, y = (square & 7) + dx, (square >> 3) + dy
+		while 0 <= x <= 7 and 0 <= y <= 7:
+			BETWEEN[square][y * 8 + x] = between
+			between |= 1 << (y * 8 + x)
+			x, y = x + dx, y + dy
+
+def get_rook_attacks(square, occupied):
+	masks = ROOK_BLOCKER_MASKS[square]
+	tables = ROOK_ATTACK_TABLES[square]
+	return tables[0][occupied & masks[0]] | tables[1][occupied & masks[1]]
+
+def get_bishop_attacks(square, occupied):
+	masks = BISHOP_BLOCKER_MASKS[square]
+	tables = BISHOP_ATTACK_TABLES[square]
+	return tables[0][occupied & masks[0]] | tables[1][occupied & masks[1]]
+
+def get_queen_attacks(square, occupied):
+	return get_rook_attacks(square, occupied) | get_bishop_attacks(square, occupied)
@@ -0,0 +1,420 @@
+import numpy as np
+from chess.chess_enums import PieceType, PieceColor, MoveCode
+from chess.chess_attacks import KING_OFFSETS, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, ROOK_EMPTY_ATTACKS, BISHOP_EMPTY_ATTACKS, BETWEEN
+from chess.chess_moves import encode_move, get_from_square, get_to_square, get_promotion_type
+from chess.chess_piece import ChessPiece
+import chess.chess_zobrist as chess_zobrist
+import chess.utilities.fen as fen
+
+# Many positions stored as struct of arrays, moves are generated and applied for all of them at once with NumPy
+#
+# pieces[n][square] holds PieceType.value + 1 for white pieces, the negative of it for black pieces and 0 for empty squares
+# Squares are indexed as y * 8 + x like everywhere else. For move generation every position is turned into the
+# point of view of the side to move: black positions are mirrored vertically and their colors swapped, so the side
+# to move always has positive pieces and pawns that move up the board.
+
+BATCH_PAWN = PieceType.PAWN.value + 1
+BATCH_KNIGHT = PieceType.KNIGHT.value + 1
+BATCH_BISHOP = PieceType.BISHOP.value + 1
+BATCH_ROOK = PieceType.ROOK.value + 1
+BATCH_QUEEN = PieceType.QUEEN.value + 1
+BATCH_KING = PieceType.KING.value + 1
+
+# stands for the squares off the board, it blocks every ray and is neither an own nor an enemy piece
+BATCH_OFF_BOARD = 127
+NO_SQUARE = 64
+
+# Actions index a fixed size action space
+# action < 4096              : from_square * 64 + to_square, pawns reaching the last rank promote to a queen
+# 4096 <= action < 4672      : 4096 + ((promotion_index * 64 + to_square) * 3 + file_step + 1) for under promotions,
+#                              promotion_index indexes UNDERPROMOTION_TYPES and file_step is the file change of the pawn
+UNDERPROMOTION_TYPES = [PieceType.KNIGHT, PieceType.BISHOP, PieceType.ROOK]
+UNDERPROMOTION_OFFSET = 64 * 64
+ACTION_SIZE = UNDERPROMOTION_OFFSET + len(UNDERPROMOTION_TYPES) * 64 * 3
+
+TERMINAL_NONE = 0
+TERMINAL_CHECKMATE = 1
+TERMINAL_STALEMATE = 2
+TERMINAL_FIFTY_MOVES = 3
+TERMINAL_INSUFFICIENT_MATERIAL = 4
+
+SQUARES = np.arange(64)
+MIRROR_SQUARES = SQUARES ^ 56
+
+# Returns a (64, 64) boolean matrix, matrix[square][target] tells if target is set in bitboards[square]
+def get_bitboard_matrix(bitboards):
+	return np.array([[bitboards[square] >> target & 1 for target in range(64)] for square in range(64)], dtype = bool)
+
+KNIGHT_MATRIX = get_bitboard_matrix(KNIGHT_ATTACKS)
+KING_MATRIX = get_bitboard_matrix(KING_ATTACKS)
+ROOK_MATRIX = get_bitboard_matrix(ROOK_EMPTY_ATTACKS)
+BISHOP_MATRIX = get_bitboard_matrix(BISHOP_EMPTY_ATTACKS)
+# own pawns move up the board and enemy pawns down
+PAWN_CAPTURE_MATRIX = get_bitboard_matrix(PAWN_ATTACKS[PieceColor.WHITE.value])
+ENEMY_PAWN_MATRIX = get_bitboard_matrix(PAWN_ATTACKS[PieceColor.BLACK.value])
+
+# BETWEEN_MATRIX[square][from_square * 64 + to_square] tells if square lies between the two squares, so multiplying
+# the occupancy with it counts the pieces blocking every line of a position at once
+BETWEEN_MATRIX = np.array([[BETWEEN[from_square][to_square] >> square & 1 for from_square in range(64) for to_square in range(64)] for square in range(64)], dtype = np.float32)
+# BETWEEN_LINES[from_square][to_square] are the squares between the two squares
+BETWEEN_LINES = BETWEEN_MATRIX.T.reshape(64, 64, 64).astype(bool)
+
+# RAY_TARGETS[square][direction][step - 1], directions in the order of KING_OFFSETS, the first four are rook directions
+RAY_TARGETS = np.full((64, 8, 7), NO_SQUARE, dtype = np.intp)
+# LINE_MASKS[square][direction] are the squares of the whole line through square along direction
+LINE_MASKS = np.zeros((64, 8, 64), dtype = bool)
+for square in range(64):
+	for direction, (dx, dy) in enumerate(KING_OFFSETS):
+		for sign in (1, -1):
+			x, y = (square & 7) + dx * sign, (square >> 3) + dy * sign
+			step = 0
+			while 0 <= x <= 7 and 0 <= y <= 7:
+				if sign == 1:
+					RAY_TARGETS[square, direction, step] = y * 8 + x
+				LINE_MASKS[square, direction, y * 8 + x] = True
+				x, y = x + dx * sign, y + dy * sign
+				step += 1
+
+# castle rights lost when a piece moves from or to the square, in the order of ChessBoard.get_castle_rights
+CASTLE_RIGHTS_KEPT = np.ones((64, 4), dtype = bool)
+CASTLE_RIGHTS_KEPT[4, 0:2] = False
+CASTLE_RIGHTS_KEPT[7, 0] = False
+CASTLE_RIGHTS_KEPT[0, 1] = False
+CASTLE_RIGHTS_KEPT[60, 2:4] = False
+CASTLE_RIGHTS_KEPT[63, 2] = False
+CASTLE_RIGHTS_KEPT[56, 3] = False
+
+def encode_action(from_square, to_square, promotion_type = None):
+	if promotion_type is None or promotion_type == PieceType.QUEEN:
+		return from_square * 64 + to_square
+	file_step = (to_square & 7) - (from_square & 7)
+	return UNDERPROMOTION_OFFSET + (UNDERPROMOTION_TYPES.index(promotion_type) * 64 + to_square) * 3 + file_step + 1
+
+# Returns (from_square, to_square, promotion_type), promotion_type is None for the first 4096 actions
+def decode_action(action):
+	if action < UNDERPROMOTION_OFFSET:
+		return action // 64, action % 64, None
+	index = action - UNDERPROMOTION_OFFSET
+	file_step = index % 3 - 1
+	to_square = (index // 3) % 64
+	# white promotes on the last rank, black on the first
+	from_square = to_square - file_step - 8 if to_square >= 56 else to_square - file_step + 8
+	return from_square, to_square, UNDERPROMOTION_TYPES[index // 3 // 64]
+
+def move_to_action(move):
+	return encode_action(get_from_square(move), get_to_square(move), get_promotion_type(move))
+
+# Returns the ChessBoard move of an action in the board's position
+def action_to_move(board, action):
+
+	from_square, to_square, promotion_type = decode_action(action)
+	piece_x, piece_y, x, y = from_square & 7, from_square >> 3, to_square & 7, to_square >> 3
+	piece = board.get_piece(piece_x, piece_y)
+	if piece is None:
+		raise Exception(f"Invalid action! No piece on {board.get_coordinate_string(piece_x, piece_y)}")
+
+	if piece.type == PieceType.PAWN and (y == 7 or y == 0):
+		return encode_move(MoveCode.PROMOTION_CODE, piece_x, piece_y, x, y, promotion_type if promotion_type is not None else PieceType.QUEEN)
+	if piece.type == PieceType.KING and abs(x - piece_x) == 2:
+		return encode_move(MoveCode.CASTLE_CODE, piece_x, piece_y, x, y)
+	if board.get_piece(x, y) is not None:
+		return encode_move(MoveCode.CAPTURE_CODE, piece_x, piece_y, x, y)
+	if piece.type == PieceType.PAWN and x != piece_x:
+		return encode_move(MoveCode.EN_PASSANT_CODE, piece_x, piece_y, x, y)
+	return encode_move(MoveCode.MOVE_CODE, piece_x, piece_y, x, y)
+
+# Returns a (n, 64, 64) boolean array telling for every pair of squares whether nothing stands between them
+def get_clear_lines(occupied):
+	return (occupied.astype(np.float32) @ BETWEEN_MATRIX).reshape(-1, 64, 64) == 0
+
+# Returns a (n, 64, 64) boolean array of the squares each enemy (negative) piece of relative positions attacks
+def get_enemy_attack_lines(pieces, clear_lines):
+
+	queens = pieces == -BATCH_QUEEN
+	rook_like = (pieces == -BATCH_ROOK) | queens
+	bishop_like = (pieces == -BATCH_BISHOP) | queens
+
+	lines = ((rook_like[:, :, None] & ROOK_MATRIX) | (bishop_like[:, :, None] & BISHOP_MATRIX)) & clear_lines
+	lines |= (pieces == -BATCH_KNIGHT)[:, :, None] & KNIGHT_MATRIX
+	lines |= (pieces == -BATCH_KING)[:, :, None] & KING_MATRIX
+	lines |= (pieces == -BATCH_PAWN)[:, :, None] & ENEMY_PAWN_MATRIX
+	return lines
+
+# Returns a (n, 64) boolean array of the squares attacked by the enemy pieces of relative positions
+def get_enemy_attacks(pieces):
+	return get_enemy_attack_lines(pieces, get_clear_lines(pieces != 0)).any(axis = 1)
+
+def pad_pieces(pieces):
+	padded_pieces = np.full((pieces.shape[0], 65), BATCH_OFF_BOARD, dtype = np.int8)
+	padded_pieces[:, :64] = pieces
+	return padded_pieces
+
+class BatchBoard:
+
+	def __init__(self, size, fen_string = fen.FEN_DEFAULT):
+
+		self.size = size
+		self.pieces = np.zeros((size, 64), dtype = np.int8)
+		self.turn = np.zeros(size, dtype = np.int8)
+		self.castle_rights = np.zeros((size, 4), dtype = bool)
+		self.en_passant = np.full(size, -1, dtype = np.int8)
+		self.half_move_clock = np.zeros(size, dtype = np.int16)
+		self.round = np.zeros(size, dtype = np.int32)
+
+		self.reset(None, fen_string)
+
+	# Loads the FEN position into the given positions, all of them if indices is None
+	def reset(self, indices = None, fen_string = fen.FEN_DEFAULT):
+
+		import chess.chess_board as chess_board
+		board = chess_board.ChessBoard()
+		fen.load_fen_to_board(board, fen_string)
+		self.set_board(slice(None) if indices is None else indices, board)
+
+	# Copies a ChessBoard position into the given positions
+	def set_board(self, indices, board):
+
+		pieces = np.zeros(64, dtype = np.int8)
+		for column in board.board:
+			for piece in column:
+				if piece is not None:
+					code = piece.type.value + 1
+					pieces[piece.y * 8 + piece.x] = code if piece.color == PieceColor.WHITE else -code
+
+		self.pieces[indices] = pieces
+		self.turn[indices] = board.get_turn_color().value
+		self.castle_rights[indices] = board.get_castle_rights()
+		self.en_passant[indices] = -1 if board.en_passant_target is None else board.en_passant_target[1] * 8 + board.en_passant_target[0]
+		self.half_move_clock[indices] = board.half_move_clock
+		self.round[indices] = board.round
+
+	# Writes position index into a ChessBoard, like fen.load_fen_to_board it leaves the move history alone
+	def load_board(self, index, board):
+
+		board.clear_board()
+		for square in np.flatnonzero(self.pieces[index]):
+			code = int(self.pieces[index, square])
+			color = PieceColor.WHITE if code > 0 else PieceColor.BLACK
+			board.set_piece(int(square) & 7, int(square) >> 3, ChessPiece(color, PieceType(abs(code) - 1), 0, 0))
+
+		board.set_castle_rights(tuple(bool(right) for right in self.castle_rights[index]))
+		en_passant = int(self.en_passant[index])
+		board.en_passant_target = None if en_passant < 0 else (en_passant & 7, en_passant >> 3)
+		board.half_move_clock = int(self.half_move_clock[index])
+		board.round = int(self.round[index])
+		board.zobrist_key = chess_zobrist.compute_key(board)
+		return board
+
+	# Returns the positions from the point of view of the side to move
+	def get_relative_pieces(self):
+
+		relative_pieces = self.pieces.copy()
+		black = self.turn == PieceColor.BLACK.value
+		relative_pieces[black] = -self.pieces[black][:, MIRROR_SQUARES]
+		return relative_pieces
+
+	def legal_action_mask(self):
+		return self.generate_legal_actions()[0]
+
+	# Returns (legal_mask, in_check), legal_mask is a (size, ACTION_SIZE) boolean array of the legal actions
+	def generate_legal_actions(self):
+
+		size = self.size
+		rows = np.arange(size)
+		black = self.turn == PieceColor.BLACK.value
+
+		relative_pieces = self.get_relative_pieces()
+		padded_pieces = pad_pieces(relative_pieces)
+		own_rights = np.where(black[:, None], self.castle_rights[:, 2:4], self.castle_rights[:, 0:2])
+		en_passant = np.where(self.en_passant < 0, NO_SQUARE, np.where(black, self.en_passant ^ 56, self.en_passant)).astype(np.intp)
+
+		king_squares = np.argmax(relative_pieces == BATCH_KING, axis = 1)
+		is_king = np.zeros((size, 64), dtype = bool)
+		is_king[rows, king_squares] = True
+
+		occupied = relative_pieces != 0
+		clear_lines = get_clear_lines(occupied)
+		# squares attacked by the enemy with our king taken off, so the king cannot step back along a checking ray
+		attack_lines = get_enemy_attack_lines(relative_pieces, get_clear_lines(occupied & ~is_king))
+		attacked = attack_lines.any(axis = 1)
+		in_check = attacked[rows, king_squares]
+
+		# CHECKERS AND PINS
+
+		checkers = attack_lines[rows, :, king_squares]
+		check_count = checkers.sum(axis = 1)
+		# a single check is answered by taking the checker or blocking the squares in between
+		check_mask = checkers | BETWEEN_LINES[king_squares, np.argmax(checkers, axis = 1)]
+
+		pin_masks = np.ones((size, 64, 64), dtype = bool)
+		for direction in range(8):
+			slider_code = -BATCH_ROOK if direction < 4 else -BATCH_BISHOP
+			ray = RAY_TARGETS[king_squares, direction]
+			ray_pieces = padded_pieces[rows[:, None], ray]
+			ray_occupied = (ray_pieces != 0) & (ray != NO_SQUARE)
+
+			# an own piece followed by an enemy slider of the direction is pinned
+			first = np.argmax(ray_occupied, axis = 1)
+			ray_occupied[rows, first] = False
+			second = np.argmax(ray_occupied, axis = 1)
+			second_pieces = ray_pieces[rows, second]
+			pinning = ray_occupied[rows, second] & (ray_pieces[rows, first] > 0) &\
+				((second_pieces == slider_code) | (second_pieces == -BATCH_QUEEN))
+
+			pinned_rows = np.flatnonzero(pinning)
+			if len(pinned_rows) > 0:
+				pin_masks[pinned_rows, ray[pinned_rows, first[pinned_rows]]] = LINE_MASKS[king_squares[pinned_rows], direction]
+
+		# PSEUDO LEGAL MOVES
+
+		own_queens = relative_pieces == BATCH_QUEEN
+		own_rook_like = (relative_pieces == BATCH_ROOK) | own_queens
+		own_bishop_like = (relative_pieces == BATCH_BISHOP) | own_queens
+		own_pawns = relative_pieces == BATCH_PAWN
+
+		moves = ((own_rook_like[:, :, None] & ROOK_MATRIX) | (own_bishop_like[:, :, None] & BISHOP_MATRIX)) & clear_lines
+		moves |= (relative_pieces == BATCH_KNIGHT)[:, :, None] & KNIGHT_MATRIX
+		moves |= is_king[:, :, None] & KING_MATRIX & ~attacked[:, None, :]
+		moves |= own_pawns[:, :, None] & PAWN_CAPTURE_MATRIX & (relative_pieces < 0)[:, None, :]
+		moves &= (relative_pieces <= 0)[:, None, :]
+
+		pushes = own_pawns[:, :56] & ~occupied[:, 8:]
+		moves[:, SQUARES[:56], SQUARES[8:]] |= pushes
+		double_pushes = pushes[:, 8:16] & ~occupied[:, 24:32]
+		moves[:, SQUARES[8:16], SQUARES[24:32]] |= double_pushes
+
+		en_passant_rows = np.flatnonzero(en_passant != NO_SQUARE)
+		en_passant_moves = own_pawns[en_passant_rows] & PAWN_CAPTURE_MATRIX[:, en_passant[en_passant_rows]].T
+		en_passant_rows, en_passant_from = en_passant_rows[np.nonzero(en_passant_moves)[0]], np.nonzero(en_passant_moves)[1]
+		en_passant_to = en_passant[en_passant_rows]
+		moves[en_passant_rows, en_passant_from, en_passant_to] = True
+
+		# the king must not start, pass or land on an attacked square
+		kingside = own_rights[:, 0] & (relative_pieces[:, 4] == BATCH_KING) & (relative_pieces[:, 7] == BATCH_ROOK) &\
+			~occupied[:, 5] & ~occupied[:, 6] & ~attacked[:, 4] & ~attacked[:, 5] & ~attacked[:, 6]
+		queenside = own_rights[:, 1] & (relative_pieces[:, 4] == BATCH_KING) & (relative_pieces[:, 0] == BATCH_ROOK) &\
+			~occupied[:, 1] & ~occupied[:, 2] & ~occupied[:, 3] & ~attacked[:, 4] & ~attacked[:, 3] & ~attacked[:, 2]
+		moves[:, 4, 6] |= kingside
+		moves[:, 4, 2] |= queenside
+
+		# LEGALITY
+
+		evasions = (check_count == 0)[:, None] | ((check_count == 1)[:, None] & check_mask)
+		legal = np.where(is_king[:, :, None], moves, moves & evasions[:, None, :] & pin_masks)
+
+		# en passant removes two pieces from the rank of the king, so those few moves are checked on the resulting position
+		if len(en_passant_rows) > 0:
+			resulting_pieces = relative_pieces[en_passant_rows].copy()
+			resulting_rows = np.arange(len(en_passant_rows))
+			resulting_pieces[resulting_rows, en_passant_from] = 0
+			resulting_pieces[resulting_rows, en_passant_to - 8] = 0
+			resulting_pieces[resulting_rows, en_passant_to] = BATCH_PAWN
+			safe = ~get_enemy_attacks(resulting_pieces)[resulting_rows, king_squares[en_passant_rows]]
+			legal[en_passant_rows, en_passant_from, en_passant_to] = safe
+
+		# back to the absolute board
+		promotions = legal[:, 48:56, 56:64] & own_pawns[:, 48:56, None]
+		legal[black] = legal[black][:, MIRROR_SQUARES][:, :, MIRROR_SQUARES]
+
+		legal_mask = np.zeros((size, ACTION_SIZE), dtype = bool)
+		legal_mask[:, :UNDERPROMOTION_OFFSET] = legal.reshape(size, 64 * 64)
+
+		for from_file in range(8):
+			for file_step in (-1, 0, 1):
+				to_file = from_file + file_step
+				if not 0 <= to_file <= 7:
+					continue
+				to_squares = np.where(black, to_file, 56 + to_file)
+				promoting = promotions[:, from_file, to_file]
+				for promotion_index in range(len(UNDERPROMOTION_TYPES)):
+					legal_mask[rows, UNDERPROMOTION_OFFSET + (promotion_index * 64 + to_squares) * 3 + file_step + 1] |= promoting
+
+		return legal_mask, in_check
+
+	# Applies one action per position, positions with a negative action are left as they are
+	def apply_actions(self, actions):
+
+		actions = np.asarray(actions, dtype = np.int64)
+		rows = np.flatnonzero(actions >= 0)
+		actions = actions[rows]
+
+		under = actions >= UNDERPROMOTION_OFFSET
+		index = np.where(under, actions - UNDERPROMOTION_OFFSET, 0)
+		file_step = index % 3 - 1
+		under_to = (index // 3) % 64
+		under_from = np.where(under_to >= 56, under_to - file_step - 8, under_to - file_step + 8)
+		from_squares = np.where(under, under_from, actions // 64)
+		to_squares = np.where(under, under_to, actions % 64)
+
+		pieces = self.pieces[rows, from_squares]
+		captured = self.pieces[rows, to_squares]
+		piece_types = np.abs(pieces)
+		signs = np.sign(pieces).astype(np.int8)
+		is_pawn = piece_types == BATCH_PAWN
+
+		# en passant takes the pawn beside the moving pawn
+		en_passant = is_pawn & (to_squares == self.en_passant[rows]) & ((from_squares & 7) != (to_squares & 7))
+		en_passant_rows = rows[en_passant]
+		self.pieces[en_passant_rows, (from_squares[en_passant] & ~7) | (to_squares[en_passant] & 7)] = 0
+
+		# castling moves the rook beside the king
+		castling = (piece_types == BATCH_KING) & (np.abs(to_squares - from_squares) == 2)
+		castling_rows = rows[castling]
+		kingside = to_squares[castling] > from_squares[castling]
+		rook_from = np.where(kingside, from_squares[castling] + 3, from_squares[castling] - 4)
+		rook_to = np.where(kingside, from_squares[castling] + 1, from_squares[castling] - 1)
+		self.pieces[castling_rows, rook_to] = self.pieces[castling_rows, rook_from]
+		self.pieces[castling_rows, rook_from] = 0
+
+		promoting = is_pawn & ((to_squares >= 56) | (to_squares < 8))
+		promotion_codes = np.where(under, np.array([BATCH_KNIGHT, BATCH_BISHOP, BATCH_ROOK])[index // 3 // 64], BATCH_QUEEN)
+		moved_pieces = np.where(promoting, signs * promotion_codes, pieces).astype(np.int8)
+
+		self.pieces[rows, from_squares] = 0
+		self.pieces[rows, to_squares] = moved_pieces
+
+		self.castle_rights[rows] &= CASTLE_RIGHTS_KEPT[from_squares] & CASTLE_RIGHTS_KEPT[to_squares]
+		double_push = is_pawn & (np.abs(to_squares - from_squares) == 16)
+		self.en_passant[rows] = np.where(double_push, (from_squares + to_squares) // 2, -1)
+		self.half_move_clock[rows] = np.where(is_pawn | (captured != 0), 0, self.half_move_clock[rows] + 1)
+		self.turn[rows] ^= 1
+		self.round[rows] += 1
+
+	# Returns a TERMINAL_* code per position
+	def get_terminal_states(self, legal_mask = None, in_check = None):
+
+		if legal_mask is None or in_check is None:
+			legal_mask, in_check = self.generate_legal_actions()
+
+		states = np.full(self.size, TERMINAL_NONE, dtype = np.int8)
+
+		piece_types = np.abs(self.pieces)
+		heavy = ((piece_types == BATCH_PAWN) | (piece_types == BATCH_ROOK) | (piece_types == BATCH_QUEEN)).any(axis = 1)
+		minors = ((piece_types == BATCH_KNIGHT) | (piece_types == BATCH_BISHOP)).sum(axis = 1)
+		states[~heavy & (minors <= 1)] = TERMINAL_INSUFFICIENT_MATERIAL
+		states[self.half_move_clock >= 100] = TERMINAL_FIFTY_MOVES
+
+		no_moves = ~legal_mask.any(axis = 1)
+		states[no_moves & ~in_check] = TERMINAL_STALEMATE
+		states[no_moves & in_check] = TERMINAL_CHECKMATE
+		return states
+
+	# Returns 1 where white won, -1 where black won and 0 otherwise
+	def get_results(self, terminal_states):
+		winner_sign = np.where(self.turn == PieceColor.WHITE.value, -1, 1).astype(np.int8)
+		return np.where(terminal_states == TERMINAL_CHECKMATE, winner_sign, 0).astype(np.int8)
+
+	# Applies the actions and returns (legal_mask, terminal_states) of the new positions
+	def step(self, actions):
+
+		self.apply_actions(actions)
+		legal_mask, in_check = self.generate_legal_actions()
+		return legal_mask, self.get_terminal_states(legal_mask, in_check)
+
+# Returns a BatchBoard holding the positions of the ChessBoards
+def batch_from_boards(boards):
+
+	batch = BatchBoard(len(boards))
+	for i, board in enumerate(boards):
+		batch.set_board(i, board)
+	return batch
@@ -0,0 +1,28 @@
+# Bitboard helpers
+# Squares are indexed as y * 8 + x, so a1 = 0, h1 = 7, a8 = 56 and h8 = 63.
+# A bitboard is a python int where bit n is set if square n is part of the set.
+
+BOARD_MASK = 0xFFFFFFFFFFFFFFFF
+
+def square_x(square):
+	return square & 7
+
+def square_y(square):
+	return square >> 3
+
+def square_bit(x, y):
+	return 1 << (y * 8 + x)
+
+def pop_count(bitboard):
+	return bitboard.bit_count()
+
+# Returns the index of the least significant set bit or -1 for an empty bitboard
+def lsb_index(bitboard):
+	return (bitboard & -bitboard).bit_length() - 1
+
+# Yields the index of every set bit from least to most significant
+def iterate_squares(bitboard):
+	while bitboard:
+		lsb = bitboard & -bitboard
+		yield lsb.bit_length() - 1
+		bitboard ^= lsb
@@ -1,9 +1,23 @@
 from chess.chess_enums import PieceType, PieceColor, MoveCode
 import chess.chess_moves
+from chess.chess_moves import decode_move, get_move_code, get_move_to, get_castle_rook_squares, get_en_passant_capture_square
 import chess.chess_piece
 from chess.chess_piece import ChessPiece
-import copy
+from array import array
 import chess.utilities.fen as fen
+import chess.chess_zobrist as chess_zobrist
+import chess.chess_evaluation as chess_evaluation
+import chess.utilities.packed as packed
+from chess.chess_transposition import BOUND_EXACT
+from chess.chess_legality import LegalityInfo, get_attackers, get_attacked_squares, get_opponent_color
+from chess.chess_bitboard import square_bit, square_x, square_y, lsb_index, iterate_squares
+
+# undo records above history_limit are dropped in chunks of this size, so trimming costs nothing per move
+HISTORY_TRIM_SIZE = 64
+
+# limits interactive sessions pass to set_history_limits, well above the deepest search
+HISTORY_DEFAULT_LIMIT = 256
+HISTORY_DEFAULT_KEYFRAME_INTERVAL = 32
 
 class ChessBoard():
 
@@ -11,6 +25,13 @@ class ChessBoard():
 
 		self.board_width = 8
 		self.board_height = 8
+
+		# no cap and no keyframes unless set_history_limits is called
+		self.history_limit = None
+		self.keyframe_interval = None
+
+		# legal move lists are only memoized once set_move_cache is called
+		self.move_cache = None
 		
 		self.reset_board()
 
@@ -27,37 +48,140 @@ class ChessBoard():
 		self.black_can_castle_kingside = True
 		self.black_can_castle_queenside = True
 
-		self.move_history = []
-		self.previous_board_states = []
-		self.removed_board_states = []
-		self.removed_move_history = []
+		self.clear_history()
 
 		fen.load_fen_to_board(self, "r2qkbnr/pP1bpppp/2n5/8/8/8/PPPP1PPP/RNBQKBNR w KQkq - 1 5")
 
+	# History is a log of every move since the loaded position plus an undo record per move, undo records are only
+	# kept for the last history_limit moves. Keyframes, packed copies of the whole position every keyframe_interval
+	# plies, let jump_to_ply reach the moves whose undo records were dropped.
+	def clear_history(self):
+		self.move_history = array("I")
+		self.undo_records = []
+		self.removed_move_history = []
+		self.keyframes = {}
+
+	# history_limit should stay above the deepest search, which undoes its own moves from the same records
+	def set_history_limits(self, history_limit = None, keyframe_interval = None):
+		self.history_limit = history_limit
+		self.keyframe_interval = keyframe_interval
+		self.trim_history()
+
+	def trim_history(self):
+		if self.history_limit is not None and len(self.undo_records) > self.history_limit:
+			del self.undo_records[:len(self.undo_records) - self.history_limit]
+
+	# Returns the number of moves played since the loaded position
+	def get_ply(self):
+		return len(self.move_history)
+
+	# Moves to the position after the first ply moves of the history, undone moves stay available to retrieve_next_move
+	# Undo records and redo moves are used where they reach, otherwise the position is rebuilt from the nearest keyframe
+	def jump_to_ply(self, ply):
+
+		current_ply = len(self.move_history)
+		if ply > current_ply:
+			if ply - current_ply > len(self.removed_move_history):
+				raise Exception(f"Can not jump to ply {ply}, only {len(self.removed_move_history)} undone moves follow")
+			while len(self.move_history) < ply:
+				self.retrieve_next_move()
+			return
+
+		if current_ply - ply <= len(self.undo_records):
+			while len(self.move_history) > ply:
+				self.undo_last_move()
+			return
+
+		keyframe_plies = [keyframe_ply for keyframe_ply in self.keyframes if keyframe_ply <= ply]
+		if ply < 0 or len(keyframe_plies) == 0:
+			raise Exception(f"Can not jump to ply {ply}, it is no longer in the history")
+		keyframe_ply = max(keyframe_plies)
+
+		moves = self.move_history
+		keyframes = self.keyframes
+		removed_move_history = self.removed_move_history
+		removed_move_history.extend(reversed(moves[ply:]))
+
+		packed.unpack_board(self.keyframes[keyframe_ply], self)
+		self.move_history = moves[:keyframe_ply]
+		self.keyframes = keyframes
+		self.removed_move_history = removed_move_history
+		for move in moves[keyframe_ply:ply]:
+			self.apply_move(move)
+
+	# Removes every piece and empties the bitboards
+	def clear_board(self):
+
+		self.board = [[None for j in range(self.board_height)] for i in range(self.board_width)]
+
+		# twelve occupancy masks indexed by [color][type], kept in sync with self.board
+		self.piece_bitboards = [[0 for piece_type in PieceType] for piece_color in PieceColor]
+		self.color_bitboards = [0 for piece_color in PieceColor]
+		self.occupied_bitboard = 0
+
+		# position key, every piece placed or removed is xored in by set_piece and remove_piece
+		self.zobrist_key = 0
+
+		# running material and piece-square sums of chess_evaluation, kept up to date the same way
+		self.midgame_score = 0
+		self.endgame_score = 0
+		self.phase = 0
+
+	# Places piece at (x,y), removing whatever was there before
+	def set_piece(self, x, y, piece):
+
+		self.remove_piece(x, y)
+
+		bit = square_bit(x, y)
+		self.piece_bitboards[piece.color.value][piece.type.value] |= bit
+		self.color_bitboards[piece.color.value] |= bit
+		self.occupied_bitboard |= bit
+		self.zobrist_key ^= chess_zobrist.PIECE_KEYS[piece.color.value][piece.type.value][y * 8 + x]
+		self.midgame_score += chess_evaluation.MIDGAME_SCORES[piece.color.value][piece.type.value][y * 8 + x]
+		self.endgame_score += chess_evaluation.ENDGAME_SCORES[piece.color.value][piece.type.value][y * 8 + x]
+		self.phase += chess_evaluation.PHASE_WEIGHTS[piece.type.value]
+
+		piece.x = x
+		piece.y = y
+		self.board[x][y] = piece
+
+	# Removes and returns the piece at (x,y), None if the square is empty
+	def remove_piece(self, x, y):
+
+		piece = self.board[x][y]
+		if piece is None:
+			return None
+
+		bit = square_bit(x, y)
+		self.piece_bitboards[piece.color.value][piece.type.value] ^= bit
+		self.color_bitboards[piece.color.value] ^= bit
+		self.occupied_bitboard ^= bit
+		self.zobrist_key ^= chess_zobrist.PIECE_KEYS[piece.color.value][piece.type.value][y * 8 + x]
+		self.midgame_score -= chess_evaluation.MIDGAME_SCORES[piece.color.value][piece.type.value][y * 8 + x]
+		self.endgame_score -= chess_evaluation.ENDGAME_SCORES[piece.color.value][piece.type.value][y * 8 + x]
+		self.phase -= chess_evaluation.PHASE_WEIGHTS[piece.type.value]
+
+		self.board[x][y] = None
+		return piece
+
+	def get_pieces_bitboard(self, color, piece_type):
+		return self.piece_bitboards[color.value][piece_type.value]
+
+	def get_color_bitboard(self, color):
+		return self.color_bitboards[color.value]
+
+	# Returns the pieces of the given color by walking its occupancy mask
+	def get_pieces(self, color):
+		return [self.board[square_x(square)][square_y(square)] for square in iterate_squares(self.color_bitboards[color.value])]
+
 	# Returns a boolean indicating whether the square at (x,y) with the given color is attacked by an enemy piece
+	# Looks outward from the square for knights, pawns, the king and the first blocker on every sliding ray
 	def is_square_attacked(self, x, y, color):
+		return get_attackers(self, x, y, get_opponent_color(color)) != 0
 
-		enemy_pieces = []
-		for i in range(self.board_width):
-			for j in range(self.board_height):
-				if self.board[i][j] == None:
-					continue
-				
-				if self.board[i][j].color != color:
-					enemy_pieces.append(self.board[i][j])
-
-		for piece in enemy_pieces:
-			moves = piece.get_legal_moves(self, False)
-			for move in moves:
-				target_x, target_y = move[5], move[6]
-				if target_x == x and target_y == y:
-					return True
-		return False
-
-	def get_state_after_move(self, move):
-		new_board = copy.deepcopy(self)
-		new_board.make_move(move)
-		return new_board
+	# Returns a bitboard of all the squares attacked by the enemies of the given color
+	def get_attacked_squares(self, color):
+		return get_attacked_squares(self, get_opponent_color(color))
 
 	def get_en_passant_target(self):
 		return self.en_passant_target
@@ -76,54 +200,91 @@ class ChessBoard():
 			return None
 		return self.board[x][y]
 
+	# move_cache is a MoveCache or None to generate the legal moves every time
+	def set_move_cache(self, move_cache):
+		self.move_cache = move_cache
+
 	def get_legal_moves(self, color):
+
+		if self.move_cache is not None:
+			cached_moves = self.move_cache.probe(self.zobrist_key, color)
+			if cached_moves is not None:
+				return list(cached_moves)
 				
 		legal_moves = []
 
-		for i in range(self.board_width):
-			for j in range(self.board_height):
-				if self.board[i][j] == None:
-					continue
-				
-				if self.board[i][j].color == color:
-					moves = self.board[i][j].get_legal_moves(self)
-					legal_moves += moves # self.board[i][j].get_legal_moves(self)
+		# checks and pins are worked out once and shared by every piece
+		legality = LegalityInfo(self, color)
+		for piece in self.get_pieces(color):
+			legal_moves += piece.get_legal_moves(self, True, legality)
 
+		if self.move_cache is not None:
+			self.move_cache.store(self.zobrist_key, color, legal_moves)
 		return legal_moves
 
 
 	def get_king(self, color):
-		for i in range(self.board_width):
-			for j in range(self.board_height):
-				if self.board[i][j] == None:
-					continue
-				
-				if self.board[i][j].color == color and self.board[i][j].type == PieceType.KING:
-					return self.board[i][j]
-		return None
+		king_square = lsb_index(self.piece_bitboards[color.value][PieceType.KING.value])
+		if king_square < 0:
+			return None
+		return self.board[square_x(king_square)][square_y(king_square)]
+
+	def get_castle_rights(self):
+		return (self.white_can_castle_kingside, self.white_can_castle_queenside, self.black_can_castle_kingside, self.black_can_castle_queenside)
 
+	def set_castle_rights(self, castle_rights):
+		self.white_can_castle_kingside, self.white_can_castle_queenside, self.black_can_castle_kingside, self.black_can_castle_queenside = castle_rights
+
+	# Reverts the last move using its undo record, only the squares the move touched are restored
 	def undo_last_move(self):
 		if len(self.move_history) == 0:
 			return
 
+		if len(self.undo_records) == 0:
+			# the record was dropped by the history limit
+			if len(self.keyframes) > 0 and min(self.keyframes) < len(self.move_history):
+				self.jump_to_ply(len(self.move_history) - 1)
+			return
+
+		self.removed_move_history.append(self.undo_move())
+
+	# Reverts the last move without keeping it for retrieve_next_move, returns the move
+	def undo_move(self):
 		last_move = self.move_history.pop()
-		self.round -= 1
-		
-		self.removed_move_history.append(last_move)
-		self.removed_board_states.append(copy.deepcopy(self.board))
-		self.board = self.previous_board_states.pop()
+		self.unmake_move(last_move, self.undo_records.pop())
+		return last_move
+
+	def unmake_move(self, move, undo_record):
+
+		piece, piece_x, piece_y, captured_piece, castle_rights, en_passant_target, half_move_clock, zobrist_key = undo_record
+		move_code = get_move_code(move)
+		target_x, target_y = get_move_to(move)
 
+		# the promoted piece is simply dropped, piece is the original pawn
+		self.remove_piece(target_x, target_y)
+		self.set_piece(piece_x, piece_y, piece)
+
+		if move_code == MoveCode.CASTLE_CODE:
+			rook_x, rook_y, rook_target_x, rook_target_y = get_castle_rook_squares(move)
+			self.set_piece(rook_x, rook_y, self.remove_piece(rook_target_x, rook_target_y))
+
+		# captured pieces keep their coordinates, which also covers en passant
+		if captured_piece is not None:
+			self.set_piece(captured_piece.x, captured_piece.y, captured_piece)
+
+		self.set_castle_rights(castle_rights)
+		self.en_passant_target = en_passant_target
+		self.half_move_clock = half_move_clock
+		self.zobrist_key = zobrist_key
+		self.round -= 1
 
 	def retrieve_next_move(self):
 		if len(self.removed_move_history) == 0:
 			return
 
 		retrived_move = self.removed_move_history.pop()
-		self.round += 1
-
-		self.move_history.append(retrived_move)
-		self.previous_board_states.append(copy.deepcopy(self.board))
-		self.board = self.removed_board_states.pop()
+		self.store_keyframe()
+		self.apply_move(retrived_move)
 		
 
 	def update_castle_rights(self):
@@ -155,22 +316,41 @@ class ChessBoard():
 
 	def make_move(self, move):
 
-		# SAVE PREVIOUS BOARD STATE
+		# a new move invalidates the moves that were undone, and the keyframes taken along them
+		if len(self.removed_move_history) > 0:
+			self.removed_move_history = []
+			for keyframe_ply in [keyframe_ply for keyframe_ply in self.keyframes if keyframe_ply > len(self.move_history)]:
+				del self.keyframes[keyframe_ply]
+		self.store_keyframe()
+		self.apply_move(move)
 
-		self.removed_move_history = []
-		self.removed_board_states = []
-		self.previous_board_states.append(copy.deepcopy(self.board))
+	# Keyframes are only taken for moves played into the history, never for the moves a search tries and undoes
+	def store_keyframe(self):
+		if self.keyframe_interval is not None and len(self.move_history) % self.keyframe_interval == 0 and len(self.move_history) not in self.keyframes:
+			self.keyframes[len(self.move_history)] = packed.pack_board(self)
+
+	def apply_move(self, move):
+
+		# SAVE UNDO RECORD
+
+		undo_castle_rights = self.get_castle_rights()
+		undo_en_passant_target = self.en_passant_target
+		undo_half_move_clock = self.half_move_clock
+		undo_zobrist_key = self.zobrist_key
+		captured_piece = None
+
+		# the castle and en passant parts of the key are swapped after the pieces moved
+		self.zobrist_key ^= chess_zobrist.get_castle_key(undo_castle_rights) ^ chess_zobrist.get_en_passant_key(self)
 
 		# UPDATE BOARD STATE
 
 		# clear en passant target on new move
 		self.en_passant_target = None
 
-		move_code = move[0]
+		move_code, piece_x, piece_y, target_x, target_y, promotion_type = decode_move(move)
 
 		if move_code == MoveCode.MOVE_CODE:
 			# get piece
-			piece_x,piece_y,target_x,target_y = move[3:7]
 			piece = self.get_piece(piece_x, piece_y)
 			target = self.get_piece(target_x, target_y)
 			
@@ -184,14 +364,11 @@ class ChessBoard():
 				self.en_passant_target = (target_x, (target_y + piece_y) // 2)
 
 			# Swap places on board
-			self.board[piece_x][piece_y] = None
-			piece.x = target_x
-			piece.y = target_y
-			self.board[target_x][target_y] = piece
+			self.remove_piece(piece_x, piece_y)
+			self.set_piece(target_x, target_y, piece)
 		
 		elif move_code == MoveCode.CAPTURE_CODE:
 
-			piece_x,piece_y,target_x,target_y = move[3:7]
 			piece = self.get_piece(piece_x, piece_y)
 			target = self.get_piece(target_x, target_y)
 
@@ -200,28 +377,27 @@ class ChessBoard():
 			if piece == None:
 				raise Exception(f"Invalid action! No piece on {self.get_coordinate_string(piece_x,piece_y)}")
 
-			self.board[piece_x][piece_y] = None
-			piece.x = target_x
-			piece.y = target_y
-			self.board[target_x][target_y] = piece
+			self.remove_piece(piece_x, piece_y)
+			captured_piece = self.remove_piece(target_x, target_y)
+			self.set_piece(target_x, target_y, piece)
 			
 		elif move_code == MoveCode.PROMOTION_CODE:
 
-			piece_x,piece_y,target_x,target_y,promotion_type = move[3:8]
 			piece = self.get_piece(piece_x, piece_y)
 			target = self.get_piece(target_x, target_y)
 
 			if piece == None:
 				raise Exception(f"Invalid action! No piece on {self.get_coordinate_string(piece_x,piece_y)}")
 
-			self.board[piece_x][piece_y] = None
+			self.remove_piece(piece_x, piece_y)
+			captured_piece = self.remove_piece(target_x, target_y)
 
 			promoted_piece = ChessPiece(piece.color, promotion_type, target_x, target_y)
-			self.board[target_x][target_y] = promoted_piece
+			self.set_piece(target_x, target_y, promoted_piece)
 
 		elif move_code == MoveCode.EN_PASSANT_CODE:
 
-			piece_x,piece_y,target_x,target_y, capture_x, capture_y = move[3:9]
+			capture_x, capture_y = get_en_passant_capture_square(move)
 			piece = self.get_piece(piece_x, piece_y)
 			move_target = self.get_piece(target_x, target_y)
 			capture_target = self.get_piece(capture_x, capture_y)
@@ -233,15 +409,13 @@ class ChessBoard():
 			if capture_target == None:
 				raise Exception(f"Invalid action! Piece on {self.get_coordinate_string(piece_x,piece_y)} cannot capture {self.get_coordinate_string(capture_x,capture_y)}. Nothing there")
 
-			self.board[piece_x][piece_y] = None
-			self.board[capture_x][capture_y] = None
-			piece.x = target_x
-			piece.y = target_y
-			self.board[target_x][target_y] = piece
+			self.remove_piece(piece_x, piece_y)
+			captured_piece = self.remove_piece(capture_x, capture_y)
+			self.set_piece(target_x, target_y, piece)
 		
 		elif move_code == MoveCode.CASTLE_CODE:
 
-			piece_x,piece_y,target_x,target_y,rook_x, rook_y, rook_target_x, rook_target_y = move[3:11]
+			rook_x, rook_y, rook_target_x, rook_target_y = get_castle_rook_squares(move)
 			piece = self.get_piece(piece_x, piece_y)
 			rook = self.get_piece(rook_x, rook_y)
 			move_target = self.get_piece(target_x, target_y)
@@ -256,20 +430,37 @@ class ChessBoard():
 			if rook_target != None:
 				raise Exception(f"Invalid action! Piece on {self.get_coordinate_string(rook_x,rook_y)} cannot move to {self.get_coordinate_string(rook_target_x,rook_target_y)}. Square is occupied")
 
-			self.board[piece_x][piece_y] = None
-			self.board[rook_x][rook_y] = None
-			piece.x = target_x
-			piece.y = target_y
-			rook.x = rook_target_x
-			rook.y = rook_target_y
-			self.board[target_x][target_y] = piece
-			self.board[rook_target_x][rook_target_y] = rook
+			self.remove_piece(piece_x, piece_y)
+			self.remove_piece(rook_x, rook_y)
+			self.set_piece(target_x, target_y, piece)
+			self.set_piece(rook_target_x, rook_target_y, rook)
 
 		# Update board stats
 		self.update_castle_rights()
+		if piece.type == PieceType.PAWN or captured_piece is not None:
+			self.half_move_clock = 0
+		else:
+			self.half_move_clock += 1
 		self.round += 1
+		self.zobrist_key ^= chess_zobrist.get_castle_key(self.get_castle_rights()) ^ chess_zobrist.get_en_passant_key(self) ^ chess_zobrist.BLACK_TO_MOVE_KEY
 		self.move_history.append(move)
+		self.undo_records.append((piece, piece_x, piece_y, captured_piece, undo_castle_rights, undo_en_passant_target, undo_half_move_clock, undo_zobrist_key))
+		if self.history_limit is not None and len(self.undo_records) > self.history_limit + HISTORY_TRIM_SIZE:
+			self.trim_history()
+
 
+	def get_zobrist_key(self):
+		return self.zobrist_key
+
+	# Returns how many times the current position occurred before, only positions since the last pawn move or capture can repeat
+	def get_repetition_count(self):
+
+		repetition_count = 0
+		plies = min(self.half_move_clock, len(self.undo_records))
+		for i in range(2, plies + 1, 2):
+			if self.undo_records[-i][7] == self.zobrist_key:
+				repetition_count += 1
+		return repetition_count
 
 	def get_retrieve_move(self):
 		if len(self.removed_move_history) == 0:
@@ -281,6 +472,42 @@ class ChessBoard():
 			return None
 		return self.move_history[-1]
 
+	# Counts the leaf nodes of the legal move tree up to the given depth
+	# Subtree counts of transposed positions are reused when a transposition table is given
+	def perft(self, depth, transposition_table = None):
+
+		if depth == 0:
+			return 1
+
+		if transposition_table is not None and depth > 1:
+			entry = transposition_table.probe(self.zobrist_key)
+			if entry is not None and entry.depth == depth:
+				return entry.score
+
+		legal_moves = self.get_legal_moves(self.get_turn_color())
+		if depth == 1:
+			return len(legal_moves)
+
+		nodes = 0
+		for move in legal_moves:
+			self.apply_move(move)
+			nodes += self.perft(depth - 1, transposition_table)
+			self.undo_move()
+
+		if transposition_table is not None:
+			transposition_table.store(self.zobrist_key, depth, BOUND_EXACT, nodes)
+		return nodes
+
+	# Returns the perft node count below every legal move, keyed by its coordinate string
+	def divide(self, depth, transposition_table = None):
+
+		move_nodes = {}
+		for move in self.get_legal_moves(self.get_turn_color()):
+			self.apply_move(move)
+			move_nodes[chess.chess_moves.get_move_string(move)] = self.perft(depth - 1, transposition_table)
+			self.undo_move()
+		return move_nodes
+
 	def display_board(self):
 
 		# display coordinates too
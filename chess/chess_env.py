@@ -0,0 +1,203 @@
+import gym
+import numpy as np
+from gym import spaces
+import chess.chess_board as chess_board
+import chess.utilities.fen as fen
+from chess.chess_enums import PieceColor, PieceType
+from chess.chess_batch import BatchBoard, ACTION_SIZE, TERMINAL_NONE, TERMINAL_CHECKMATE, TERMINAL_STALEMATE, TERMINAL_FIFTY_MOVES,\
+	TERMINAL_INSUFFICIENT_MATERIAL, move_to_action, action_to_move
+
+# Observations are (OBSERVATION_PLANES, 8, 8) float32 tensors indexed [plane][y][x]
+# planes 0-5 hold the white pieces and 6-11 the black pieces in PieceType order, then the side to move (ones for
+# black), the four castle rights in the order of ChessBoard.get_castle_rights and the en passant target square
+PIECE_PLANES = 12
+TURN_PLANE = 12
+CASTLE_PLANE = 13
+EN_PASSANT_PLANE = 17
+OBSERVATION_PLANES = 18
+
+# the repetition that makes a position appear for the third time ends the game as a draw
+TERMINAL_REPETITION = 5
+
+DEFAULT_MAX_MOVES = 512
+
+def get_observation_space(num_envs = None):
+	shape = (OBSERVATION_PLANES, 8, 8) if num_envs is None else (num_envs, OBSERVATION_PLANES, 8, 8)
+	return spaces.Box(0.0, 1.0, shape, dtype = np.float32)
+
+# Writes the observation of the board into observation
+def write_observation(board, observation):
+
+	bitboards = np.array(board.piece_bitboards[PieceColor.WHITE.value] + board.piece_bitboards[PieceColor.BLACK.value], dtype = np.uint64)
+	bits = np.unpackbits(bitboards.view(np.uint8).reshape(PIECE_PLANES, 8), axis = 1, bitorder = "little")
+	observation[:PIECE_PLANES] = bits.reshape(PIECE_PLANES, 8, 8)
+
+	observation[TURN_PLANE] = board.get_turn_color().value
+	for i, castle_right in enumerate(board.get_castle_rights()):
+		observation[CASTLE_PLANE + i] = castle_right
+	observation[EN_PASSANT_PLANE] = 0
+	if board.en_passant_target is not None:
+		x, y = board.en_passant_target
+		observation[EN_PASSANT_PLANE, y, x] = 1
+
+# Writes the observations of every position of a BatchBoard into observations
+def write_batch_observations(batch, observations):
+
+	pieces = batch.pieces.reshape(batch.size, 8, 8)
+	for piece_type in PieceType:
+		observations[:, piece_type.value] = pieces == piece_type.value + 1
+		observations[:, 6 + piece_type.value] = pieces == -(piece_type.value + 1)
+
+	observations[:, TURN_PLANE] = batch.turn[:, None, None]
+	observations[:, CASTLE_PLANE:EN_PASSANT_PLANE] = batch.castle_rights[:, :, None, None]
+	observations[:, EN_PASSANT_PLANE] = 0
+	en_passant_rows = np.flatnonzero(batch.en_passant >= 0)
+	en_passant = batch.en_passant[en_passant_rows]
+	observations[en_passant_rows, EN_PASSANT_PLANE, en_passant >> 3, en_passant & 7] = 1
+
+def has_insufficient_material(board):
+
+	white_pieces = board.piece_bitboards[PieceColor.WHITE.value]
+	black_pieces = board.piece_bitboards[PieceColor.BLACK.value]
+	for piece_type in (PieceType.PAWN, PieceType.ROOK, PieceType.QUEEN):
+		if white_pieces[piece_type.value] or black_pieces[piece_type.value]:
+			return False
+
+	minors = 0
+	for piece_type in (PieceType.KNIGHT, PieceType.BISHOP):
+		minors += white_pieces[piece_type.value].bit_count() + black_pieces[piece_type.value].bit_count()
+	return minors <= 1
+
+# Returns the TERMINAL_* code of the position, legal_moves are the legal moves of the side to move
+def get_terminal_state(board, legal_moves):
+
+	color = board.get_turn_color()
+	if len(legal_moves) == 0:
+		king = board.get_king(color)
+		if king is not None and board.is_square_attacked(king.x, king.y, color):
+			return TERMINAL_CHECKMATE
+		return TERMINAL_STALEMATE
+	if board.half_move_clock >= 100:
+		return TERMINAL_FIFTY_MOVES
+	if board.get_repetition_count() >= 2:
+		return TERMINAL_REPETITION
+	if has_insufficient_material(board):
+		return TERMINAL_INSUFFICIENT_MATERIAL
+	return TERMINAL_NONE
+
+# Gym environment playing both sides of one ChessBoard
+# Actions are indices of the chess_batch action space, the reward is 1 for the side that gives checkmate
+# The returned observation and info["action_mask"] are buffers of the environment that the next step overwrites
+class ChessEnv(gym.Env):
+
+	def __init__(self, fen_string = fen.FEN_DEFAULT, max_moves = DEFAULT_MAX_MOVES):
+
+		self.fen_string = fen_string
+		self.max_moves = max_moves
+		self.observation_space = get_observation_space()
+		self.action_space = spaces.Discrete(ACTION_SIZE)
+
+		self.board = chess_board.ChessBoard()
+		self.observation = np.zeros(self.observation_space.shape, dtype = np.float32)
+		self.action_mask = np.zeros(ACTION_SIZE, dtype = bool)
+		self.legal_moves = {}
+
+	def reset(self, seed = None, options = None):
+
+		super().reset(seed = seed)
+		fen_string = options.get("fen", self.fen_string) if options is not None else self.fen_string
+		self.board.reset_board()
+		fen.load_fen_to_board(self.board, fen_string)
+		self.moves_played = 0
+		self.update()
+		return self.observation, self.get_info()
+
+	def step(self, action):
+
+		move = self.legal_moves.get(int(action))
+		if move is None:
+			raise Exception(f"Illegal action {action}")
+
+		self.board.make_move(move)
+		self.moves_played += 1
+		self.update()
+
+		terminated = self.terminal_state != TERMINAL_NONE
+		truncated = not terminated and self.moves_played >= self.max_moves
+		reward = 1.0 if self.terminal_state == TERMINAL_CHECKMATE else 0.0
+		return self.observation, reward, terminated, truncated, self.get_info()
+
+	def update(self):
+
+		legal_moves = self.board.get_legal_moves(self.board.get_turn_color())
+		self.legal_moves = {move_to_action(move): move for move in legal_moves}
+		self.action_mask.fill(False)
+		self.action_mask[list(self.legal_moves)] = True
+		self.terminal_state = get_terminal_state(self.board, legal_moves)
+		write_observation(self.board, self.observation)
+
+	def get_info(self):
+		return {"action_mask": self.action_mask, "terminal_state": self.terminal_state}
+
+	def get_move(self, action):
+		return action_to_move(self.board, action)
+
+# Gym vector environment stepping num_envs games at once on a BatchBoard
+# Finished games are reset within the same step like gym's own vector environments, info["terminal_state"] tells how
+# the game of each environment ended and info["final_observation"] holds the last observation of the finished games.
+# Rewards are 1 for the side that gives checkmate. Repetitions are not tracked, games are cut off after max_moves.
+class ChessVectorEnv(gym.vector.VectorEnv):
+
+	def __init__(self, num_envs, fen_string = fen.FEN_DEFAULT, max_moves = DEFAULT_MAX_MOVES):
+
+		super().__init__(num_envs, get_observation_space(), spaces.Discrete(ACTION_SIZE))
+		self.fen_string = fen_string
+		self.max_moves = max_moves
+		self.batch = BatchBoard(num_envs, fen_string)
+		# every reset game starts from the same position, so its legal actions are only generated once
+		self.initial_action_mask = BatchBoard(1, fen_string).legal_action_mask()[0]
+
+		self.observations = np.zeros((num_envs, OBSERVATION_PLANES, 8, 8), dtype = np.float32)
+		self.final_observations = np.zeros((num_envs, OBSERVATION_PLANES, 8, 8), dtype = np.float32)
+		self.rewards = np.zeros(num_envs, dtype = np.float32)
+		self.moves_played = np.zeros(num_envs, dtype = np.int32)
+
+	def reset(self, seed = None, options = None):
+
+		if seed is not None:
+			self._np_random, seed = gym.utils.seeding.np_random(seed)
+		self.batch.reset(None, self.fen_string)
+		self.moves_played.fill(0)
+		self.action_mask, in_check = self.batch.generate_legal_actions()
+		self.terminal_states = np.full(self.num_envs, TERMINAL_NONE, dtype = np.int8)
+		write_batch_observations(self.batch, self.observations)
+		return self.observations, self.get_info()
+
+	def step(self, actions):
+
+		actions = np.asarray(actions)
+		if not self.action_mask[np.arange(self.num_envs), actions].all():
+			raise Exception("Illegal action in vector step")
+
+		self.batch.apply_actions(actions)
+		self.moves_played += 1
+		self.action_mask, in_check = self.batch.generate_legal_actions()
+		self.terminal_states = self.batch.get_terminal_states(self.action_mask, in_check)
+
+		terminated = self.terminal_states != TERMINAL_NONE
+		truncated = ~terminated & (self.moves_played >= self.max_moves)
+		np.copyto(self.rewards, self.terminal_states == TERMINAL_CHECKMATE)
+
+		write_batch_observations(self.batch, self.observations)
+		finished = np.flatnonzero(terminated | truncated)
+		if len(finished) > 0:
+			self.final_observations[finished] = self.observations[finished]
+			self.batch.reset(finished, self.fen_string)
+			self.moves_played[finished] = 0
+			self.action_mask[finished] = self.initial_action_mask
+			write_batch_observations(self.batch, self.observations)
+
+		return self.observations, self.rewards, terminated, truncated, self.get_info()
+
+	def get_info(self):
+		return {"action_mask": self.action_mask, "terminal_state": self.terminal_states, "final_observation": self.final_observations}
@@ -0,0 +1,232 @@
+import numpy as np
+from chess.chess_enums import PieceType, PieceColor, MoveCode
+from chess.chess_moves import decode_move, get_en_passant_capture_square
+from chess.chess_legality import get_attackers, get_opponent_color
+from chess.chess_bitboard import square_bit
+
+# Material and piece-square tables, tapered between a midgame and an endgame score by the material left on the board
+# Scores are in centipawns, the running midgame and endgame sums and the phase are kept up to date by
+# ChessBoard.set_piece and remove_piece, so evaluating a position costs a handful of operations
+
+MIDGAME_PIECE_VALUES = [100, 320, 330, 500, 900, 0]
+ENDGAME_PIECE_VALUES = [120, 300, 320, 520, 920, 0]
+
+# phase a piece adds while it is on the board, a full set of pieces makes EVALUATION_PHASE_TOTAL
+PHASE_WEIGHTS = [0, 1, 1, 2, 4, 0]
+EVALUATION_PHASE_TOTAL = 24
+
+# Tables are written as seen by white, rank 8 first
+PAWN_TABLE = [
+	  0,   0,   0,   0,   0,   0,   0,   0,
+	 50,  50,  50,  50,  50,  50,  50,  50,
+	 10,  10,  20,  30,  30,  20,  10,  10,
+	  5,   5,  10,  25,  25,  10,   5,   5,
+	  0,   0,   0,  20,  20,   0,   0,   0,
+	  5,  -5, -10,   0,   0, -10,  -5,   5,
+	  5,  10,  10, -20, -20,  10,  10,   5,
+	  0,   0,   0,   0,   0,   0,   0,   0,
+]
+
+PAWN_ENDGAME_TABLE = [
+	  0,   0,   0,   0,   0,   0,   0,   0,
+	 80,  80,  80,  80,  80,  80,  80,  80,
+	 50,  50,  50,  50,  50,  50,  50,  50,
+	 30,  30,  30,  30,  30,  30,  30,  30,
+	 15,  15,  15,  15,  15,  15,  15,  15,
+	  5,   5,   5,   5,   5,   5,   5,   5,
+	  0,   0,   0,   0,   0,   0,   0,   0,
+	  0,   0,   0,   0,   0,   0,   0,   0,
+]
+
+KNIGHT_TABLE = [
+	-50, -40, -30, -30, -30, -30, -40, -50,
+	-40, -20,   0,   0,   0,   0, -20, -40,
+	-30,   0,  10,  15,  15,  10,   0, -30,
+	-30,   5,  15,  20,  20,  15,   5, -30,
+	-30,   0,  15,  20,  20,  15,   0, -30,
+	-30,   5,  10,  15,  15,  10,   5, -30,
+	-40, -20,   0,   5,   5,   0, -20, -40,
+	-50, -40, -30, -30, -30, -30, -40, -50,
+]
+
+BISHOP_TABLE = [
+	-20, -10, -10, -10, -10, -10, -10, -20,
+	-10,   0,   0,   0,   0,   0,   0, -10,
+	-10,   0,   5,  10,  10,   5,   0, -10,
+	-10,   5,   5,  10,  10,   5,   5, -10,
+	-10,   0,  10,  10,  10,  10,   0, -10,
+	-10,  10,  10,  10,  10,  10,  10, -10,
+	-10,   5,   0,   0,   0,   0,   5, -10,
+	-20, -10, -10, -10, -10, -10, -10, -20,
+]
+
+ROOK_TABLE = [
+	  0,   0,   0,   0,   0,   0,   0,   0,
+	  5,  10,  10,  10,  10,  10,  10,   5,
+	 -5,   0,   0,   0,   0,   0,   0,  -5,
+	 -5,   0,   0,   0,   0,   0,   0,  -5,
+	 -5,   0,   0,   0,   0,   0,   0,  -5,
+	 -5,   0,   0,   0,   0,   0,   0,  -5,
+	 -5,   0,   0,   0,   0,   0,   0,  -5,
+	  0,   0,   0,   5,   5,   0,   0,   0,
+]
+
+QUEEN_TABLE = [
+	-20, -10, -10,  -5,  -5, -10, -10, -20,
+	-10,   0,   0,   0,   0,   0,   0, -10,
+	-10,   0,   5,   5,   5,   5,   0, -10,
+	 -5,   0,   5,   5,   5,   5,   0,  -5,
+	  0,   0,   5,   5,   5,   5,   0,  -5,
+	-10,   5,   5,   5,   5,   5,   0, -10,
+	-10,   0,   5,   0,   0,   0,   0, -10,
+	-20, -10, -10,  -5,  -5, -10, -10, -20,
+]
+
+KING_TABLE = [
+	-30, -40, -40, -50, -50, -40, -40, -30,
+	-30, -40, -40, -50, -50, -40, -40, -30,
+	-30, -40, -40, -50, -50, -40, -40, -30,
+	-30, -40, -40, -50, -50, -40, -40, -30,
+	-20, -30, -30, -40, -40, -30, -30, -20,
+	-10, -20, -20, -20, -20, -20, -20, -10,
+	 20,  20,   0,   0,   0,   0,  20,  20,
+	 20,  30,  10,   0,   0,  10,  30,  20,
+]
+
+KING_ENDGAME_TABLE = [
+	-50, -40, -30, -20, -20, -30, -40, -50,
+	-30, -20, -10,   0,   0, -10, -20, -30,
+	-30, -10,  20,  30,  30,  20, -10, -30,
+	-30, -10,  30,  40,  40,  30, -10, -30,
+	-30, -10,  30,  40,  40,  30, -10, -30,
+	-30, -10,  20,  30,  30,  20, -10, -30,
+	-30, -30,   0,   0,   0,   0, -30, -30,
+	-50, -30, -30, -30, -30, -30, -30, -50,
+]
+
+MIDGAME_TABLES = [PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE, QUEEN_TABLE, KING_TABLE]
+ENDGAME_TABLES = [PAWN_ENDGAME_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE, QUEEN_TABLE, KING_ENDGAME_TABLE]
+
+# Returns SCORES[color][type][square] of a set of tables, material included, positive for white and negative for black
+def build_square_scores(piece_values, tables):
+
+	scores = [[[0] * 64 for piece_type in PieceType] for piece_color in PieceColor]
+	for piece_type in PieceType:
+		table = tables[piece_type.value]
+		for square in range(64):
+			x, y = square & 7, square >> 3
+			# white reads the table upside down since it is written rank 8 first, black reads it mirrored
+			scores[PieceColor.WHITE.value][piece_type.value][square] = piece_values[piece_type.value] + table[(7 - y) * 8 + x]
+			scores[PieceColor.BLACK.value][piece_type.value][square] = -(piece_values[piece_type.value] + table[y * 8 + x])
+	return scores
+
+MIDGAME_SCORES = build_square_scores(MIDGAME_PIECE_VALUES, MIDGAME_TABLES)
+ENDGAME_SCORES = build_square_scores(ENDGAME_PIECE_VALUES, ENDGAME_TABLES)
+
+# Returns (midgame_score, endgame_score, phase) of the board from scratch, what set_piece and remove_piece keep up to date
+def compute_scores(board):
+
+	midgame_score = 0
+	endgame_score = 0
+	phase = 0
+	for color in PieceColor:
+		for piece_type in PieceType:
+			midgame_scores = MIDGAME_SCORES[color.value][piece_type.value]
+			endgame_scores = ENDGAME_SCORES[color.value][piece_type.value]
+			bitboard = board.piece_bitboards[color.value][piece_type.value]
+			while bitboard:
+				square = (bitboard & -bitboard).bit_length() - 1
+				midgame_score += midgame_scores[square]
+				endgame_score += endgame_scores[square]
+				phase += PHASE_WEIGHTS[piece_type.value]
+				bitboard &= bitboard - 1
+	return midgame_score, endgame_score, phase
+
+def get_tapered_score(midgame_score, endgame_score, phase):
+	phase = min(phase, EVALUATION_PHASE_TOTAL)
+	return (midgame_score * phase + endgame_score * (EVALUATION_PHASE_TOTAL - phase)) // EVALUATION_PHASE_TOTAL
+
+# Score of the position for the side to move
+def evaluate(board):
+	score = get_tapered_score(board.midgame_score, board.endgame_score, board.phase)
+	return score if board.round % 2 == 0 else -score
+
+# The tables flattened to [piece, square] in the piece encoding of chess_batch, white pawn to king then black pawn to king
+BATCH_PIECE_CODES = np.array([piece_type.value + 1 for piece_type in PieceType] + [-(piece_type.value + 1) for piece_type in PieceType], dtype = np.int8)
+MIDGAME_VECTOR = np.array([MIDGAME_SCORES[color.value][piece_type.value] for color in PieceColor for piece_type in PieceType], dtype = np.float32).reshape(-1)
+ENDGAME_VECTOR = np.array([ENDGAME_SCORES[color.value][piece_type.value] for color in PieceColor for piece_type in PieceType], dtype = np.float32).reshape(-1)
+PHASE_VECTOR = np.repeat(np.array([PHASE_WEIGHTS[piece_type.value] for color in PieceColor for piece_type in PieceType], dtype = np.float32), 64)
+
+# Returns the scores of an (n, 64) array of pieces in the encoding of chess_batch, as an int64 array
+# The scores are for white, or for the side to move when turn gives it per position as 0 for white and 1 for black
+def evaluate_many(pieces, turn = None):
+
+	pieces = np.asarray(pieces)
+	size = len(pieces)
+	# one hot planes of every piece, scored with one matrix product per table
+	planes = (pieces[:, None, :] == BATCH_PIECE_CODES[None, :, None]).reshape(size, -1).astype(np.float32)
+	midgame_scores = (planes @ MIDGAME_VECTOR).astype(np.int64)
+	endgame_scores = (planes @ ENDGAME_VECTOR).astype(np.int64)
+	phases = np.minimum((planes @ PHASE_VECTOR).astype(np.int64), EVALUATION_PHASE_TOTAL)
+
+	scores = (midgame_scores * phases + endgame_scores * (EVALUATION_PHASE_TOTAL - phases)) // EVALUATION_PHASE_TOTAL
+	if turn is not None:
+		scores = np.where(np.asarray(turn) == 0, scores, -scores)
+	return scores
+
+# Returns the scores of every position of a BatchBoard for its side to move
+def evaluate_batch(batch):
+	return evaluate_many(batch.pieces, batch.turn)
+
+# Piece values of the static exchange evaluation, the king is worth more than anything it could win
+EXCHANGE_PIECE_VALUES = [100, 320, 330, 500, 900, 20000]
+
+# Returns the material the side to move wins with a capture or promotion, in centipawns, if both sides keep
+# recapturing on the target square with their least valuable attacker for as long as it pays off
+# Works on bitboards alone, sliders behind a capturer join in once it has left, pins are not looked at
+def get_exchange_score(board, move):
+
+	move_code, piece_x, piece_y, target_x, target_y, promotion_type = decode_move(move)
+	piece = board.board[piece_x][piece_y]
+	occupied = board.occupied_bitboard ^ square_bit(piece_x, piece_y)
+
+	if move_code == MoveCode.EN_PASSANT_CODE:
+		capture_x, capture_y = get_en_passant_capture_square(move)
+		occupied ^= square_bit(capture_x, capture_y)
+		gains = [EXCHANGE_PIECE_VALUES[PieceType.PAWN.value]]
+	else:
+		target = board.board[target_x][target_y]
+		gains = [EXCHANGE_PIECE_VALUES[target.type.value] if target is not None else 0]
+
+	# the piece standing on the square after each capture, which the next capture wins
+	piece_value = EXCHANGE_PIECE_VALUES[piece.type.value]
+	if promotion_type is not None:
+		piece_value = EXCHANGE_PIECE_VALUES[promotion_type.value]
+		gains[0] += piece_value - EXCHANGE_PIECE_VALUES[PieceType.PAWN.value]
+
+	color = get_opponent_color(piece.color)
+	while True:
+		attackers = get_attackers(board, target_x, target_y, color, occupied) & occupied
+		if attackers == 0:
+			break
+
+		pieces = board.piece_bitboards[color.value]
+		for piece_type in PieceType:
+			piece_attackers = attackers & pieces[piece_type.value]
+			if piece_attackers:
+				break
+
+		gains.append(piece_value - gains[-1])
+		# the side to capture is behind whether it captures or not, so the earlier captures decide the exchange
+		if max(-gains[-2], gains[-1]) < 0:
+			gains.pop()
+			break
+
+		piece_value = EXCHANGE_PIECE_VALUES[piece_type.value]
+		occupied ^= piece_attackers & -piece_attackers
+		color = get_opponent_color(color)
+
+	# every side stops capturing where that is better for it
+	for i in range(len(gains) - 1, 0, -1):
+		gains[i - 1] = -max(-gains[i - 1], gains[i])
+	return gains[0]
@@ -0,0 +1,146 @@
+from chess.chess_enums import PieceType, PieceColor, MoveCode
+from chess.chess_moves import decode_move, get_castle_rook_squares, get_en_passant_capture_square
+from chess.chess_bitboard import BOARD_MASK, square_bit, square_x, square_y, pop_count, iterate_squares
+from chess.chess_attacks import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, ROOK_EMPTY_ATTACKS, BISHOP_EMPTY_ATTACKS, BETWEEN, get_rook_attacks, get_bishop_attacks
+
+def get_opponent_color(color):
+	return PieceColor.BLACK if color == PieceColor.WHITE else PieceColor.WHITE
+
+# Returns a bitboard of the attacker_color pieces attacking (x,y)
+# occupied replaces the board occupancy when walking sliding rays, e.g. to look through a king that is about to move
+def get_attackers(board, x, y, attacker_color, occupied = None):
+
+	if occupied is None:
+		occupied = board.occupied_bitboard
+
+	square = y * 8 + x
+	pieces = board.piece_bitboards[attacker_color.value]
+	queens = pieces[PieceType.QUEEN.value]
+
+	# a pawn attacks the square if a pawn of the other color on the square would attack the pawn
+	attackers = (KNIGHT_ATTACKS[square] & pieces[PieceType.KNIGHT.value]) | (KING_ATTACKS[square] & pieces[PieceType.KING.value]) |\
+		(PAWN_ATTACKS[1 - attacker_color.value][square] & pieces[PieceType.PAWN.value])
+
+	rook_sliders = pieces[PieceType.ROOK.value] | queens
+	if rook_sliders & ROOK_EMPTY_ATTACKS[square]:
+		attackers |= get_rook_attacks(square, occupied) & rook_sliders
+	bishop_sliders = pieces[PieceType.BISHOP.value] | queens
+	if bishop_sliders & BISHOP_EMPTY_ATTACKS[square]:
+		attackers |= get_bishop_attacks(square, occupied) & bishop_sliders
+
+	return attackers
+
+# Returns a bitboard of the squares attacked by a piece of the given type and color standing on (x,y)
+def get_piece_attacks(piece_type, color, x, y, occupied):
+
+	square = y * 8 + x
+	if piece_type == PieceType.PAWN:
+		return PAWN_ATTACKS[color.value][square]
+	if piece_type == PieceType.KNIGHT:
+		return KNIGHT_ATTACKS[square]
+	if piece_type == PieceType.KING:
+		return KING_ATTACKS[square]
+	if piece_type == PieceType.ROOK:
+		return get_rook_attacks(square, occupied)
+	if piece_type == PieceType.BISHOP:
+		return get_bishop_attacks(square, occupied)
+	return get_rook_attacks(square, occupied) | get_bishop_attacks(square, occupied)
+
+# Returns a bitboard of every square attacked by the attacker_color pieces
+def get_attacked_squares(board, attacker_color, occupied = None):
+
+	if occupied is None:
+		occupied = board.occupied_bitboard
+
+	attacked = 0
+	for square in iterate_squares(board.color_bitboards[attacker_color.value]):
+		piece = board.board[square_x(square)][square_y(square)]
+		attacked |= get_piece_attacks(piece.type, piece.color, piece.x, piece.y, occupied)
+	return attacked
+
+# Checkers, pinned pieces and the check evasion mask of one side, computed once per position
+# Pseudo legal moves are then filtered with is_legal without making them on the board
+class LegalityInfo:
+
+	def __init__(self, board, color):
+
+		self.board = board
+		self.color = color
+		self.enemy_color = get_opponent_color(color)
+		self.king = board.get_king(color)
+
+		self.checkers = 0
+		self.check_count = 0
+		self.check_mask = BOARD_MASK
+		self.pinned = 0
+		self.pin_masks = {}
+
+		if self.king is None:
+			return
+
+		king_square = self.king.y * 8 + self.king.x
+		self.king_bit = 1 << king_square
+
+		self.checkers = get_attackers(board, self.king.x, self.king.y, self.enemy_color)
+		self.check_count = pop_count(self.checkers)
+
+		if self.check_count > 1:
+			# only the king can move out of a double check
+			self.check_mask = 0
+		elif self.check_count == 1:
+			# a sliding checker can also be blocked on the squares in between
+			checker_square = self.checkers.bit_length() - 1
+			self.check_mask = self.checkers | BETWEEN[king_square][checker_square]
+
+		# an enemy slider on a line to the king pins the only piece in between if that piece is ours
+		enemy_pieces = board.piece_bitboards[self.enemy_color.value]
+		enemy_queens = enemy_pieces[PieceType.QUEEN.value]
+		pinners = (ROOK_EMPTY_ATTACKS[king_square] & (enemy_pieces[PieceType.ROOK.value] | enemy_queens)) |\
+			(BISHOP_EMPTY_ATTACKS[king_square] & (enemy_pieces[PieceType.BISHOP.value] | enemy_queens))
+
+		own_pieces = board.color_bitboards[color.value]
+		occupied = board.occupied_bitboard
+		for pinner_square in iterate_squares(pinners):
+			between = BETWEEN[king_square][pinner_square] & occupied
+			if between & own_pieces and between & (between - 1) == 0:
+				self.pinned |= between
+				self.pin_masks[between.bit_length() - 1] = BETWEEN[king_square][pinner_square] | (1 << pinner_square)
+
+	# Returns whether a pseudo legal move of this side leaves its own king safe
+	def is_legal(self, move):
+
+		if self.king is None:
+			return False
+
+		move_code, piece_x, piece_y, target_x, target_y, promotion_type = decode_move(move)
+		piece_bit = square_bit(piece_x, piece_y)
+		target_bit = square_bit(target_x, target_y)
+
+		if piece_bit == self.king_bit:
+			occupied = self.board.occupied_bitboard ^ self.king_bit
+			if move_code == MoveCode.CASTLE_CODE:
+				if self.check_count > 0:
+					return False
+				# the king may not pass through an attacked square, which is where the rook lands
+				rook_x, rook_y, rook_target_x, rook_target_y = get_castle_rook_squares(move)
+				if get_attackers(self.board, rook_target_x, rook_target_y, self.enemy_color, occupied):
+					return False
+			return get_attackers(self.board, target_x, target_y, self.enemy_color, occupied) == 0
+
+		if self.check_count > 1:
+			return False
+
+		if move_code == MoveCode.EN_PASSANT_CODE:
+			# both pawns leave the rank at once, so look at the king again with the new occupancy
+			capture_x, capture_y = get_en_passant_capture_square(move)
+			capture_bit = square_bit(capture_x, capture_y)
+			occupied = (self.board.occupied_bitboard ^ piece_bit ^ capture_bit) | target_bit
+			return get_attackers(self.board, self.king.x, self.king.y, self.enemy_color, occupied) & ~capture_bit == 0
+
+		if not self.check_mask & target_bit:
+			return False
+
+		if self.pinned & piece_bit and not self.pin_masks[piece_y * 8 + piece_x] & target_bit:
+			return False
+
+		return True
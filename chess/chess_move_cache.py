@@ -0,0 +1,54 @@
+from collections import OrderedDict
+
+MOVE_CACHE_DEFAULT_SIZE = 4096
+
+# Least recently used cache of legal move lists keyed by (Zobrist key, color)
+# The key covers the pieces, castle rights, en passant file and side to move, which is everything the legal moves depend on
+class MoveCache:
+
+	def __init__(self, max_entries = MOVE_CACHE_DEFAULT_SIZE):
+		self.max_entries = max_entries
+		self.entries = OrderedDict()
+		self.clear_stats()
+
+	def clear(self):
+		self.entries.clear()
+		self.clear_stats()
+
+	def clear_stats(self):
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	# Returns the cached moves of the position as a tuple, None when they are not cached
+	def probe(self, key, color):
+
+		moves = self.entries.get((key, color.value))
+		if moves is None:
+			self.misses += 1
+			return None
+		self.hits += 1
+		self.entries.move_to_end((key, color.value))
+		return moves
+
+	def store(self, key, color, moves):
+
+		self.entries[(key, color.value)] = tuple(moves)
+		self.entries.move_to_end((key, color.value))
+		while len(self.entries) > self.max_entries:
+			self.entries.popitem(last = False)
+			self.evictions += 1
+
+	def get_hit_rate(self):
+		probes = self.hits + self.misses
+		return self.hits / probes if probes > 0 else 0.0
+
+	def get_stats(self):
+		return {
+			"entries": len(self.entries),
+			"max_entries": self.max_entries,
+			"hits": self.hits,
+			"misses": self.misses,
+			"hit_rate": self.get_hit_rate(),
+			"evictions": self.evictions,
+		}
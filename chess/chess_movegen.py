@@ -0,0 +1,126 @@
+from chess.chess_enums import PieceType, MoveCode
+from chess.chess_moves import MOVE_TO_SHIFT, MOVE_CODE_SHIFT, MOVE_CODE_MASK, MOVE_PROMOTION_SHIFT, MOVE_PROMOTION_MASK
+from chess.chess_legality import LegalityInfo, get_piece_attacks
+
+MOVE_CODE_VALUE = MOVE_CODE_MASK << MOVE_CODE_SHIFT
+QUIET_MOVE_BITS = MoveCode.MOVE_CODE.value << MOVE_CODE_SHIFT
+CASTLE_MOVE_BITS = MoveCode.CASTLE_CODE.value << MOVE_CODE_SHIFT
+CAPTURE_MOVE_BITS = MoveCode.CAPTURE_CODE.value << MOVE_CODE_SHIFT
+PROMOTION_MOVE_BITS = MoveCode.PROMOTION_CODE.value << MOVE_CODE_SHIFT
+QUEEN_PROMOTION_BITS = PieceType.QUEEN.value << MOVE_PROMOTION_SHIFT
+PROMOTION_TYPE_VALUE = MOVE_PROMOTION_MASK << MOVE_PROMOTION_SHIFT
+
+# history tables are indexed by the from and to square of a move, the low 12 bits of the packed move
+HISTORY_SIZE = 4096
+HISTORY_INDEX_MASK = HISTORY_SIZE - 1
+
+def get_history_index(move):
+	return move & HISTORY_INDEX_MASK
+
+# Quiet moves and castles, the moves killer and history ordering apply to
+def is_quiet_move(move):
+	move_bits = move & MOVE_CODE_VALUE
+	return move_bits == QUIET_MOVE_BITS or move_bits == CASTLE_MOVE_BITS
+
+# Returns whether move is one of the moves the color's piece on its from square could make, ignoring checks and pins
+# Moves from the transposition table or the killer slots may come from another position and are checked with this first
+def is_pseudo_legal(board, move, color):
+
+	piece = board.board[move & 7][(move >> 3) & 7]
+	if piece is None or piece.color != color:
+		return False
+	return move in piece.get_legal_moves(board, False)
+
+# Most valuable victim first, then least valuable attacker
+def get_capture_order(board, move):
+
+	target_square = (move >> MOVE_TO_SHIFT) & 0x3F
+	victim = board.board[target_square & 7][target_square >> 3]
+	attacker = board.board[move & 7][(move >> 3) & 7]
+	# the victim of en passant is a pawn next to the empty target square
+	victim_value = victim.type.value if victim is not None else PieceType.PAWN.value
+	return attacker.type.value - victim_value * 8
+
+# Yields the legal moves of color in stages, generating and checking each stage only when the caller gets to it
+#
+# hash move         the transposition table or principal variation move, if it is legal here
+# captures          most valuable victim, least valuable attacker first, en passant included
+# promotions        queen promotions, captures first
+# killer moves      quiet moves that caused a cutoff at the same ply, if they are legal here
+# quiet moves       by history score when a history table is given, castles included
+# underpromotions
+#
+# Every legal move is yielded exactly once, a caller that stops early never pays for the later stages
+# Without quiet moves only the captures and queen promotions are yielded, as a quiescence search wants them
+def generate_moves(board, color, hash_move = None, killer_moves = None, history = None, legality = None, quiet_moves = True):
+
+	if legality is None:
+		legality = LegalityInfo(board, color)
+	if legality.king is None:
+		return
+
+	played = []
+	if hash_move is not None and (quiet_moves or not is_quiet_move(hash_move)) and is_pseudo_legal(board, hash_move, color) and legality.is_legal(hash_move):
+		played.append(hash_move)
+		yield hash_move
+
+	enemy_pieces = board.color_bitboards[1 - color.value]
+	occupied = board.occupied_bitboard
+	pieces = board.get_pieces(color)
+
+	captures = []
+	promotions = []
+	pawn_quiet_moves = []
+	for piece in pieces:
+		if piece.type == PieceType.PAWN:
+			for move in piece.get_legal_moves_pawn(board):
+				move_bits = move & MOVE_CODE_VALUE
+				if move_bits == PROMOTION_MOVE_BITS:
+					promotions.append(move)
+				elif move_bits == QUIET_MOVE_BITS:
+					pawn_quiet_moves.append(move)
+				else:
+					captures.append(move)
+		else:
+			captures += piece.get_moves_to_targets(board, get_piece_attacks(piece.type, color, piece.x, piece.y, occupied) & enemy_pieces)
+
+	captures.sort(key = lambda move: get_capture_order(board, move))
+	for move in captures:
+		if move not in played and legality.is_legal(move):
+			yield move
+
+	queen_promotions = [move for move in promotions if move & PROMOTION_TYPE_VALUE == QUEEN_PROMOTION_BITS]
+	queen_promotions.sort(key = lambda move: board.board[(move >> MOVE_TO_SHIFT) & 7][(move >> (MOVE_TO_SHIFT + 3)) & 7] is None)
+	for move in queen_promotions:
+		if move not in played and legality.is_legal(move):
+			yield move
+
+	if not quiet_moves:
+		return
+
+	if killer_moves is not None:
+		for move in killer_moves:
+			if move not in played and is_quiet_move(move) and is_pseudo_legal(board, move, color) and legality.is_legal(move):
+				played.append(move)
+				yield move
+
+	quiet_list = pawn_quiet_moves
+	for piece in pieces:
+		if piece.type == PieceType.KING:
+			quiet_list += [move for move in piece.get_legal_moves_king(board, False) if is_quiet_move(move)]
+		elif piece.type != PieceType.PAWN:
+			quiet_list += piece.get_moves_to_targets(board, get_piece_attacks(piece.type, color, piece.x, piece.y, occupied) & ~occupied)
+
+	if history is not None:
+		quiet_list.sort(key = lambda move: -history[move & HISTORY_INDEX_MASK])
+	for move in quiet_list:
+		if move not in played and legality.is_legal(move):
+			yield move
+
+	for move in promotions:
+		if move & PROMOTION_TYPE_VALUE != QUEEN_PROMOTION_BITS and move not in played and legality.is_legal(move):
+			yield move
+
+# Yields the legal captures, en passant included, and queen promotions of color
+def generate_captures(board, color, legality = None):
+	return generate_moves(board, color, legality = legality, quiet_moves = False)
@@ -1,55 +1,105 @@
-import numpy as np
 from chess.chess_enums import PieceType, PieceColor, MoveCode
 
-# Move piece to (x,y) square
-def move_vec(piece_color, piece_type, piece_x, piece_y, x, y):
-	return np.array([MoveCode.MOVE_CODE,piece_color, piece_type, piece_x, piece_y, x, y])
+# Moves are packed into a single int
+# bits 0-5   : from square (y * 8 + x)
+# bits 6-11  : to square
+# bits 12-14 : MoveCode value
+# bits 15-17 : PieceType value of the promotion piece, 0 if the move is not a promotion
+
+MOVE_TO_SHIFT = 6
+MOVE_CODE_SHIFT = 12
+MOVE_PROMOTION_SHIFT = 15
+
+MOVE_SQUARE_MASK = 0x3F
+MOVE_CODE_MASK = 0x7
+MOVE_PROMOTION_MASK = 0x7
+
+MOVE_CODES = list(MoveCode)
+PIECE_TYPES = list(PieceType)
+
+PROMOTION_CHARS = {PieceType.QUEEN: "q", PieceType.ROOK: "r", PieceType.BISHOP: "b", PieceType.KNIGHT: "n"}
+
+def encode_move(move_code, piece_x, piece_y, x, y, promotion_type = None):
+	move = (piece_y * 8 + piece_x) | ((y * 8 + x) << MOVE_TO_SHIFT) | (move_code.value << MOVE_CODE_SHIFT)
+	if promotion_type is not None:
+		move |= promotion_type.value << MOVE_PROMOTION_SHIFT
+	return move
+
+def get_move_code(move):
+	return MOVE_CODES[(move >> MOVE_CODE_SHIFT) & MOVE_CODE_MASK]
+
+def get_from_square(move):
+	return move & MOVE_SQUARE_MASK
+
+def get_to_square(move):
+	return (move >> MOVE_TO_SHIFT) & MOVE_SQUARE_MASK
+
+def get_move_from(move):
+	return move & 7, (move >> 3) & 7
+
+def get_move_to(move):
+	return (move >> MOVE_TO_SHIFT) & 7, (move >> (MOVE_TO_SHIFT + 3)) & 7
+
+def get_promotion_type(move):
+	promotion_value = (move >> MOVE_PROMOTION_SHIFT) & MOVE_PROMOTION_MASK
+	if promotion_value == 0:
+		return None
+	return PIECE_TYPES[promotion_value]
+
+def set_promotion_type(move, promotion_type):
+	return (move & ~(MOVE_PROMOTION_MASK << MOVE_PROMOTION_SHIFT)) | (promotion_type.value << MOVE_PROMOTION_SHIFT)
+
+# Returns (move_code, piece_x, piece_y, x, y, promotion_type)
+def decode_move(move):
+	return (MOVE_CODES[(move >> MOVE_CODE_SHIFT) & MOVE_CODE_MASK], move & 7, (move >> 3) & 7,
+		(move >> MOVE_TO_SHIFT) & 7, (move >> (MOVE_TO_SHIFT + 3)) & 7, get_promotion_type(move))
+
+# Returns (rook_x, rook_y, rook_target_x, rook_target_y) of a castle move, the side follows from the king target
+def get_castle_rook_squares(move):
+	x, y = get_move_to(move)
+	if x == 6:
+		return 7, y, 5, y
+	return 0, y, 3, y
+
+# Returns the square of the pawn captured by an en passant move, it stands next to the capturing pawn
+def get_en_passant_capture_square(move):
+	return (move >> MOVE_TO_SHIFT) & 7, (move >> 3) & 7
+
+# Returns the move in coordinate notation, e.g. e2e4 or b7a8q
+def get_move_string(move):
+	piece_x, piece_y = get_move_from(move)
+	x, y = get_move_to(move)
+	move_string = chr(piece_x + 97) + str(piece_y + 1) + chr(x + 97) + str(y + 1)
+	promotion_type = get_promotion_type(move)
+	if promotion_type is not None:
+		move_string += PROMOTION_CHARS[promotion_type]
+	return move_string
 
+# Move piece to (x,y) square
 def move(piece, x, y):
-	return move_vec(piece.color, piece.type, piece.x, piece.y, x, y)
+	return encode_move(MoveCode.MOVE_CODE, piece.x, piece.y, x, y)
 
 # Capture target at (x,y) with piece
-def capture_vec(piece_color, piece_type, piece_x, piece_y, x, y):
-	return np.array([MoveCode.CAPTURE_CODE, piece_color, piece_type, piece_x, piece_y, x, y])
-
 def capture(piece, x, y):
-	return capture_vec(piece.color, piece.type, piece.x, piece.y, x, y)
-
-# Castle given side
-def castle(piece, x, y, rook, x2, y2):
-	return castle_vec(piece.color, piece.type, piece.x, piece.y, x, y, rook.x, rook.y, x2, y2)
+	return encode_move(MoveCode.CAPTURE_CODE, piece.x, piece.y, x, y)
 
-def castle_vec(piece_color, piece_type, piece_x, piece_y, x, y, rook_x, rook_y, x2, y2):
-	return np.array([MoveCode.CASTLE_CODE, piece_color, piece_type, piece_x, piece_y, x, y, rook_x, rook_y, x2, y2])
+# Castle given side by moving the king to (x,y)
+def castle(piece, x, y):
+	return encode_move(MoveCode.CASTLE_CODE, piece.x, piece.y, x, y)
 
 # Promote piece to promotion_type at (x,y)
-def promotion_vec(piece_color, piece_type, piece_x, piece_y, x, y, promotion_type):
-	return np.array([MoveCode.PROMOTION_CODE,piece_color, piece_type,  piece_x, piece_y, x, y, promotion_type])
-
 def promotion(piece, x, y, promotion_type):
-	return promotion_vec(piece.color, piece.type, piece.x, piece.y, x, y, promotion_type)
+	return encode_move(MoveCode.PROMOTION_CODE, piece.x, piece.y, x, y, promotion_type)
 
 # PromotionList at (x,y)
 def promotion_list(piece, x, y):
 	return [
-		promotion(piece, x, y, PieceType.QUEEN), 
-		promotion(piece, x, y, PieceType.ROOK), 
-		promotion(piece, x, y, PieceType.BISHOP), 
+		promotion(piece, x, y, PieceType.QUEEN),
+		promotion(piece, x, y, PieceType.ROOK),
+		promotion(piece, x, y, PieceType.BISHOP),
 		promotion(piece, x, y, PieceType.KNIGHT)
 	]
 
-# En passant piece at (x2,y2) by moving to (x,y)
-def en_passant_vec(piece_color, piece_type, piece_x, piece_y, x, y, x2, y2):
-	return np.array([MoveCode.EN_PASSANT_CODE, piece_color, piece_type, piece_x, piece_y, x, y, x2, y2])
-
-def en_passant(piece, x, y, x2, y2):
-	return en_passant_vec(piece.color, piece.type, piece.x, piece.y, x, y, x2, y2)
-
-
-
-
-
-
-
-
-
+# En passant by moving to (x,y), the captured pawn stands next to the piece
+def en_passant(piece, x, y):
+	return encode_move(MoveCode.EN_PASSANT_CODE, piece.x, piece.y, x, y)
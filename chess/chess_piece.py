@@ -1,6 +1,13 @@
-from chess.chess_moves import move, capture, castle, promotion, en_passant, promotion_list
+from chess.chess_moves import castle, en_passant, MOVE_TO_SHIFT, MOVE_CODE_SHIFT, MOVE_PROMOTION_SHIFT
+from chess.chess_bitboard import iterate_squares
+from chess.chess_attacks import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, get_rook_attacks, get_bishop_attacks, get_queen_attacks
 from chess.chess_enums import PieceType, PieceColor, MoveCode
 import chess.utilities.fen as fen
+from chess.chess_legality import LegalityInfo
+
+CAPTURE_CODE_BITS = MoveCode.CAPTURE_CODE.value << MOVE_CODE_SHIFT
+PROMOTION_CODE_BITS = MoveCode.PROMOTION_CODE.value << MOVE_CODE_SHIFT
+PROMOTION_TYPE_BITS = [piece_type.value << MOVE_PROMOTION_SHIFT for piece_type in [PieceType.QUEEN, PieceType.ROOK, PieceType.BISHOP, PieceType.KNIGHT]]
 
 class ChessPiece:
 
@@ -41,7 +48,8 @@ class ChessPiece:
 			ascii_char -= 6
 		return chr(ascii_char)
 
-	def get_legal_moves(self, board, filter_check_moves = True):
+	# legality can be passed in when the checks and pins of the position were already computed
+	def get_legal_moves(self, board, filter_check_moves = True, legality = None):
 		# returns a list of legal moves for this piece on the given board
 		legal_moves = []
 		if self.type == PieceType.PAWN:
@@ -60,62 +68,62 @@ class ChessPiece:
 			raise Exception("Invalid piece type")
 
 		if filter_check_moves:
-			legal_moves = self.filter_check_moves(board, legal_moves, self.color)
+			legal_moves = self.filter_check_moves(board, legal_moves, self.color, legality)
 
 		return legal_moves
 
-	def filter_check_moves(self, board, moves, color):
-		
-		legal_moves = []
+	def filter_check_moves(self, board, moves, color, legality = None):
 
-		for move in moves:
-			new_board = board.get_state_after_move(move)
-			king = new_board.get_king(color)
-			if king == None:
-				continue
-			if new_board.is_square_attacked(king.x, king.y, color):
-				continue
-			legal_moves.append(move)
-		
-		return legal_moves
+		if legality is None:
+			legality = LegalityInfo(board, color)
+
+		return [move for move in moves if legality.is_legal(move)]
 
 
 	# =================================
-	# LEGAL KING MOVES
+	# TARGET SQUARES
 	# =================================
-	def get_legal_moves_king(self, game_state, filter_check_moves = True):
-		# returns a list of legal moves for a king on the given board
+	def get_moves_to_targets(self, board, targets):
+		# returns quiet moves to the empty target squares and captures on the enemy ones, own pieces are skipped
 		legal_moves = []
 
-		# check 8 directions
+		from_square = self.y * 8 + self.x
+		enemy_pieces = board.color_bitboards[1 - self.color.value]
+		targets &= ~board.color_bitboards[self.color.value]
 
-		unit_vectors = [[1, 0], [0, 1], [-1, 0], [0, -1], [1, 1], [1, -1], [-1, 1], [-1, -1]]
+		for square in iterate_squares(targets):
+			if enemy_pieces >> square & 1:
+				legal_moves.append(from_square | (square << MOVE_TO_SHIFT) | CAPTURE_CODE_BITS)
+			else:
+				legal_moves.append(from_square | (square << MOVE_TO_SHIFT))
+
+		return legal_moves
 
-		for vec in unit_vectors:
-			if self.x + vec[0] >= 0 and self.x + vec[0] <= 7 and self.y + vec[1] >= 0 and self.y + vec[1] <= 7:
-				if game_state.get_piece(self.x + vec[0], self.y + vec[1]) == None:
-					legal_moves.append(move(self, self.x + vec[0], self.y + vec[1]))
-				elif game_state.get_piece(self.x + vec[0], self.y + vec[1]).color != self.color:
-					legal_moves.append(capture(self, self.x + vec[0], self.y + vec[1]))
+	# =================================
+	# LEGAL KING MOVES
+	# =================================
+	def get_legal_moves_king(self, game_state, filter_check_moves = True):
+		# returns a list of legal moves for a king on the given board
+		legal_moves = self.get_moves_to_targets(game_state, KING_ATTACKS[self.y * 8 + self.x])
 		
 		if self.color == PieceColor.WHITE:
 			if game_state.white_can_castle_kingside:
 				if game_state.get_piece(5, 0) == None and game_state.get_piece(6, 0) == None and\
 					(not filter_check_moves or game_state.is_square_attacked(5, 0, PieceColor.WHITE) == False):
-					legal_moves.append(castle(self, 6, 0, game_state.get_piece(7, 0), 5, 0))
+					legal_moves.append(castle(self, 6, 0))
 			if game_state.white_can_castle_queenside:
 				if game_state.get_piece(3, 0) == None and game_state.get_piece(2, 0) == None and game_state.get_piece(1, 0) == None and\
 					(not filter_check_moves or game_state.is_square_attacked(3, 0, PieceColor.WHITE) == False):
-					legal_moves.append(castle(self, 2, 0, game_state.get_piece(0, 0), 3, 0))
+					legal_moves.append(castle(self, 2, 0))
 		else:
 			if game_state.black_can_castle_kingside:
 				if game_state.get_piece(5, 7) == None and game_state.get_piece(6, 7) == None and\
 					(not filter_check_moves or game_state.is_square_attacked(5, 7, PieceColor.BLACK) == False):
-					legal_moves.append(castle(self, 6, 7, game_state.get_piece(7, 7), 5, 7))
+					legal_moves.append(castle(self, 6, 7))
 			if game_state.black_can_castle_queenside:
-				if game_state.get_piece(3, 7) == None and game_state.get_piece(2, 7) == None and\
+				if game_state.get_piece(3, 7) == None and game_state.get_piece(2, 7) == None and game_state.get_piece(1, 7) == None and\
 					(not filter_check_moves or game_state.is_square_attacked(3, 7, PieceColor.BLACK) == False):
-					legal_moves.append(castle(self, 2, 7, game_state.get_piece(0, 7), 3, 7))
+					legal_moves.append(castle(self, 2, 7))
 
 		return legal_moves
 
@@ -124,48 +132,14 @@ class ChessPiece:
 	# =================================
 	def get_legal_moves_queen(self, game_state):
 		# returns a list of legal moves for a queen on the given board
-		legal_moves = []
-
-		# check 8 directions
-
-		unit_vectors = [[1, 0], [0, 1], [-1, 0], [0, -1], [1, 1], [1, -1], [-1, 1], [-1, -1]]
-
-		for vec in unit_vectors:
-			for i in range(1, 8):
-				if self.x + vec[0] * i >= 0 and self.x + vec[0] * i <= 7 and self.y + vec[1] * i >= 0 and self.y + vec[1] * i <= 7:
-					if game_state.get_piece(self.x + vec[0] * i, self.y + vec[1] * i) == None:
-						legal_moves.append(move(self, self.x + vec[0] * i, self.y + vec[1] * i))
-					elif game_state.get_piece(self.x + vec[0] * i, self.y + vec[1] * i).color != self.color:
-						legal_moves.append(capture(self, self.x + vec[0] * i, self.y + vec[1] * i))
-						break
-					else:
-						break			
-		
-		return legal_moves
+		return self.get_moves_to_targets(game_state, get_queen_attacks(self.y * 8 + self.x, game_state.occupied_bitboard))
 
 	# =================================
 	# LEGAL ROOK MOVES
 	# =================================
 	def get_legal_moves_rook(self, board):
 		# returns a list of legal moves for a rook on the given board
-		legal_moves = []
-
-		# check 4 directions
-
-		unit_vectors = [[1, 0], [0, 1], [-1, 0], [0, -1]]
-
-		for vec in unit_vectors:
-			for i in range(1, 8):
-				if self.x + vec[0] * i >= 0 and self.x + vec[0] * i <= 7 and self.y + vec[1] * i >= 0 and self.y + vec[1] * i <= 7:
-					if board.get_piece(self.x + vec[0] * i, self.y + vec[1] * i) == None:
-						legal_moves.append(move(self, self.x + vec[0] * i, self.y + vec[1] * i))
-					elif board.get_piece(self.x + vec[0] * i, self.y + vec[1] * i).color != self.color:
-						legal_moves.append(capture(self, self.x + vec[0] * i, self.y + vec[1] * i))
-						break
-					else:
-						break			
-		
-		return legal_moves
+		return self.get_moves_to_targets(board, get_rook_attacks(self.y * 8 + self.x, board.occupied_bitboard))
 
 
 	# =================================
@@ -174,24 +148,7 @@ class ChessPiece:
 	
 	def get_legal_moves_bishop(self, board):
 		# returns a list of legal moves for a bishop on the given board
-		legal_moves = []
-
-		# check 4 diagonals
-
-		unit_diagonals = [[1, 1], [1, -1], [-1, 1], [-1, -1]]
-
-		for vec in unit_diagonals:
-			for i in range(1, 8):
-				if self.x + vec[0] * i >= 0 and self.x + vec[0] * i <= 7 and self.y + vec[1] * i >= 0 and self.y + vec[1] * i <= 7:
-					if board.get_piece(self.x + vec[0] * i, self.y + vec[1] * i) == None:
-						legal_moves.append(move(self, self.x + vec[0] * i, self.y + vec[1] * i))
-					elif board.get_piece(self.x + vec[0] * i, self.y + vec[1] * i).color != self.color:
-						legal_moves.append(capture(self, self.x + vec[0] * i, self.y + vec[1] * i))
-						break
-					else:
-						break			
-		
-		return legal_moves
+		return self.get_moves_to_targets(board, get_bishop_attacks(self.y * 8 + self.x, board.occupied_bitboard))
 
 	# =================================
 	# LEGAL KNIGHT MOVES
@@ -199,16 +156,7 @@ class ChessPiece:
 
 	def get_legal_moves_knight(self, board):
 		# returns a list of legal moves for a knight on the given board
-		legal_moves = []
-		for i in range(-2, 3):
-			for j in range(-2, 3):
-				if abs(i) + abs(j) == 3:
-					if self.x + i >= 0 and self.x + i <= 7 and self.y + j >= 0 and self.y + j <= 7:
-						if board.get_piece(self.x + i, self.y + j) == None:
-							legal_moves.append(move(self, self.x + i, self.y + j))
-						elif board.get_piece(self.x + i, self.y + j).color != self.color:
-							legal_moves.append(capture(self, self.x + i, self.y + j))
-		return legal_moves
+		return self.get_moves_to_targets(board, KNIGHT_ATTACKS[self.y * 8 + self.x])
 
 
 	# =================================
@@ -223,79 +171,45 @@ class ChessPiece:
 
 	def get_legal_moves_pawn_white(self, board):
 		# returns a list of legal moves for a white pawn on the given board
-		legal_moves = []
-		
-		# check promotion
-		if self.y == 6:
-			if board.get_piece(self.x, self.y + 1) == None:
-				legal_moves += promotion_list(self, self.x, self.y + 1)
-			if board.get_piece(self.x - 1, self.y + 1) != None and board.get_piece(self.x - 1, self.y + 1).color == PieceColor.BLACK:
-				legal_moves += promotion_list(self, self.x - 1, self.y + 1)
-			if board.get_piece(self.x + 1, self.y + 1) != None and board.get_piece(self.x + 1, self.y + 1).color == PieceColor.BLACK:
-				legal_moves += promotion_list(self, self.x + 1, self.y + 1)
-			
-			return legal_moves
-
-		# check if pawn can move forward one
-		if self.y < 7 and board.get_piece(self.x, self.y + 1) == None:
-			legal_moves.append(move(self, self.x, self.y + 1))
-			# check if pawn can move forward two
-			if self.y == 1 and board.get_piece(self.x, self.y + 2) == None and board.get_piece(self.x, self.y + 1) == None:
-				legal_moves.append(move(self, self.x, self.y + 2))
-		# check if pawn can capture diagonally
-		if self.y < 7:
-			if self.x > 0 and board.get_piece(self.x - 1, self.y + 1) != None and board.get_piece(self.x - 1, self.y + 1).color == PieceColor.BLACK:
-				legal_moves.append(capture(self, self.x - 1, self.y + 1))
-			if self.x < 7 and board.get_piece(self.x + 1, self.y + 1) != None and board.get_piece(self.x + 1, self.y + 1).color == PieceColor.BLACK:
-				legal_moves.append(capture(self, self.x + 1, self.y + 1))
-
-		# En passant
-		en_passant_target = board.get_en_passant_target()
-		if en_passant_target is not None and self.y == 4:
-			if en_passant_target[0] == self.x - 1:
-				legal_moves.append(en_passant(self, self.x - 1, self.y + 1, en_passant_target[0], 4))
-			elif en_passant_target[0] == self.x + 1:
-				legal_moves.append(en_passant(self, self.x + 1, self.y + 1, en_passant_target[0], 4))
-
-		return legal_moves
+		return self.get_legal_moves_pawn_direction(board, 8, 6, 1)
 
 	def get_legal_moves_pawn_black(self, board):
 		# returns a list of legal moves for a black pawn on the given board
+		return self.get_legal_moves_pawn_direction(board, -8, 1, 6)
+
+	def get_legal_moves_pawn_direction(self, board, forward, promotion_rank, start_rank):
+		# forward is the square offset of one step, pawns on promotion_rank promote with their next move
 		legal_moves = []
 
+		from_square = self.y * 8 + self.x
+		occupied = board.occupied_bitboard
+		captures = PAWN_ATTACKS[self.color.value][from_square] & board.color_bitboards[1 - self.color.value]
+		one_step = from_square + forward
+
 		# check promotion
-		if self.y == 1:
-			if board.get_piece(self.x, self.y - 1) == None:
-				legal_moves += promotion_list(self, self.x, self.y - 1)
-			if board.get_piece(self.x + 1, self.y - 1) != None and board.get_piece(self.x + 1, self.y - 1).color == PieceColor.WHITE:
-				legal_moves += promotion_list(self, self.x + 1, self.y - 1)
-			if board.get_piece(self.x - 1, self.y - 1) != None and board.get_piece(self.x - 1, self.y - 1).color == PieceColor.WHITE:
-				legal_moves += promotion_list(self, self.x - 1, self.y - 1)
+		if self.y == promotion_rank:
+			targets = captures
+			if not occupied >> one_step & 1:
+				targets |= 1 << one_step
+			for square in iterate_squares(targets):
+				for promotion_type_bits in PROMOTION_TYPE_BITS:
+					legal_moves.append(from_square | (square << MOVE_TO_SHIFT) | PROMOTION_CODE_BITS | promotion_type_bits)
 			return legal_moves
 
 		# check if pawn can move forward one
-		if self.y > 0 and board.get_piece(self.x, self.y - 1) == None:
-			legal_moves.append(move(self, self.x, self.y - 1))
+		if not occupied >> one_step & 1:
+			legal_moves.append(from_square | (one_step << MOVE_TO_SHIFT))
 			# check if pawn can move forward two
-			if self.y == 6 and board.get_piece(self.x, self.y - 2) == None and board.get_piece(self.x, self.y - 1) == None:
-				legal_moves.append(move(self, self.x, self.y - 2))
+			if self.y == start_rank and not occupied >> (one_step + forward) & 1:
+				legal_moves.append(from_square | ((one_step + forward) << MOVE_TO_SHIFT))
+
 		# check if pawn can capture diagonally
-		if self.y > 0:
-			if self.x > 0 and board.get_piece(self.x - 1, self.y - 1) != None and board.get_piece(self.x - 1, self.y - 1).color == PieceColor.WHITE:
-				legal_moves.append(capture(self, self.x - 1, self.y - 1))
-			if self.x < 7 and board.get_piece(self.x + 1, self.y - 1) != None and board.get_piece(self.x + 1, self.y - 1).color == PieceColor.WHITE:
-				legal_moves.append(capture(self, self.x + 1, self.y - 1))
+		for square in iterate_squares(captures):
+			legal_moves.append(from_square | (square << MOVE_TO_SHIFT) | CAPTURE_CODE_BITS)
 
 		# En passant
 		en_passant_target = board.get_en_passant_target()
-		if en_passant_target is not None and self.y == 3:
-			if en_passant_target[0] == self.x - 1:
-				legal_moves.append(en_passant(self, self.x - 1, self.y - 1, en_passant_target[0], 3))
-			elif en_passant_target[0] == self.x + 1:
-				legal_moves.append(en_passant(self, self.x + 1, self.y - 1, en_passant_target[0], 3))
+		if en_passant_target is not None and PAWN_ATTACKS[self.color.value][from_square] >> (en_passant_target[1] * 8 + en_passant_target[0]) & 1:
+			legal_moves.append(en_passant(self, en_passant_target[0], en_passant_target[1]))
 
 		return legal_moves
-
-
-
-
@@ -0,0 +1,275 @@
+import time
+from chess.chess_enums import PieceType
+from chess.chess_evaluation import evaluate, get_exchange_score, EXCHANGE_PIECE_VALUES
+from chess.chess_legality import LegalityInfo
+from chess.chess_moves import get_move_string, get_move_to
+from chess.chess_movegen import generate_moves, generate_captures, is_quiet_move, get_history_index, HISTORY_SIZE, MOVE_CODE_VALUE, PROMOTION_MOVE_BITS
+from chess.chess_transposition import TranspositionTable, BOUND_EXACT, BOUND_LOWER, BOUND_UPPER
+
+# Scores are in centipawns from the point of view of the side to move
+MATE_SCORE = 100000
+MATE_THRESHOLD = MATE_SCORE - 1000
+INFINITE_SCORE = MATE_SCORE + 1
+
+# how many nodes are searched between two looks at the clock
+SEARCH_CHECK_INTERVAL = 256
+
+# quiet moves remembered per ply for causing a beta cutoff
+SEARCH_KILLER_COUNT = 2
+
+# what a capture may gain beyond the captured piece through the position, delta pruning skips captures that can not
+# reach alpha even with this much on top
+QUIESCENCE_DELTA_MARGIN = 200
+
+# Mate scores are stored relative to the node instead of the root so they stay valid in transpositions
+def score_to_transposition(score, ply):
+	if score >= MATE_THRESHOLD:
+		return score + ply
+	if score <= -MATE_THRESHOLD:
+		return score - ply
+	return score
+
+def score_from_transposition(score, ply):
+	if score >= MATE_THRESHOLD:
+		return score - ply
+	if score <= -MATE_THRESHOLD:
+		return score + ply
+	return score
+
+# Returns the search score of a tablebase value, the distance to mate counted from the root like the mates the search finds
+def get_tablebase_score(value, ply):
+	if value > 0:
+		return MATE_SCORE - (ply + value - 1)
+	if value < 0:
+		return -MATE_SCORE + (ply - value - 1)
+	return 0
+
+class SearchResult:
+
+	def __init__(self, best_move, score, depth, nodes, elapsed, principal_variation):
+		self.best_move = best_move
+		self.score = score
+		self.depth = depth
+		self.nodes = nodes
+		self.elapsed = elapsed
+		self.principal_variation = principal_variation
+
+	def get_nps(self):
+		return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+	# Returns the mate distance in moves, negative when the side to move gets mated, None if the score is not a mate
+	def get_mate_in(self):
+		if abs(self.score) < MATE_THRESHOLD:
+			return None
+		plies = MATE_SCORE - abs(self.score)
+		return (plies + 1) // 2 if self.score > 0 else -((plies + 1) // 2)
+
+	def get_pv_string(self):
+		return " ".join(get_move_string(move) for move in self.principal_variation)
+
+	def __str__(self):
+		mate_in = self.get_mate_in()
+		score_string = f"mate {mate_in}" if mate_in is not None else f"cp {self.score}"
+		return f"depth {self.depth} score {score_string} nodes {self.nodes} nps {self.get_nps():.0f} time {self.elapsed:.2f} pv {self.get_pv_string()}"
+
+# Negamax alpha-beta search with iterative deepening
+# The board is searched in place with apply_move/undo_move and is left as it was found
+class SearchEngine:
+
+	def __init__(self, max_depth = 64, max_time = None, max_nodes = None, transposition_table = None, tablebase = None):
+		self.max_depth = max_depth
+		self.max_time = max_time
+		self.max_nodes = max_nodes
+		self.transposition_table = transposition_table if transposition_table is not None else TranspositionTable()
+		# positions the tablebase covers are scored by one lookup instead of a search
+		self.tablebase = tablebase
+		self.stopped = False
+
+	# Can be called from another thread, the search returns the last completed iteration
+	def stop(self):
+		self.stopped = True
+
+	# on_iteration is called with the SearchResult of every completed depth
+	# A caller that runs the search on another thread clears the stop itself before starting the thread and passes
+	# reset_stop = False, so a stop that comes before the thread reaches the search is not lost
+	def search(self, board, on_iteration = None, reset_stop = True):
+
+		self.board = board
+		self.nodes = 0
+		if reset_stop:
+			self.stopped = False
+		self.start_time = time.perf_counter()
+		self.principal_variation = []
+		self.transposition_table.new_search()
+		self.killer_moves = [[] for ply in range(self.max_depth + 1)]
+		self.history = [0] * HISTORY_SIZE
+
+		result = None
+		for depth in range(1, self.max_depth + 1):
+			self.root_depth = depth
+			score, principal_variation = self.search_node(depth, 0, -INFINITE_SCORE, INFINITE_SCORE)
+
+			# an interrupted iteration is only trusted once there is nothing better to fall back on
+			if self.stopped and result is not None:
+				break
+
+			self.principal_variation = principal_variation
+			best_move = principal_variation[0] if len(principal_variation) > 0 else None
+			result = SearchResult(best_move, score, depth, self.nodes, time.perf_counter() - self.start_time, principal_variation)
+
+			if on_iteration is not None:
+				on_iteration(result)
+
+			if self.stopped or best_move is None or abs(score) >= MATE_THRESHOLD:
+				break
+
+		return result
+
+	def check_limits(self):
+		if self.max_nodes is not None and self.nodes >= self.max_nodes:
+			self.stopped = True
+		if self.max_time is not None and time.perf_counter() - self.start_time >= self.max_time:
+			self.stopped = True
+
+	# Returns (score, principal_variation) of the position
+	def search_node(self, depth, ply, alpha, beta):
+
+		self.nodes += 1
+		if self.nodes % SEARCH_CHECK_INTERVAL == 0:
+			self.check_limits()
+		# the first iteration always completes so there is a move to play
+		if self.stopped and self.root_depth > 1:
+			return 0, []
+
+		board = self.board
+		if ply > 0 and (board.half_move_clock >= 100 or board.get_repetition_count() > 0):
+			return 0, []
+
+		if ply > 0 and self.tablebase is not None:
+			value = self.tablebase.probe(board)
+			if value is not None:
+				return get_tablebase_score(value, ply), []
+
+		key = board.zobrist_key
+		transposition_move = None
+		entry = self.transposition_table.probe(key)
+		if entry is not None:
+			transposition_move = entry.move
+			if ply > 0 and entry.depth >= depth:
+				score = score_from_transposition(entry.score, ply)
+				if entry.bound == BOUND_EXACT or (entry.bound == BOUND_LOWER and score >= beta) or (entry.bound == BOUND_UPPER and score <= alpha):
+					return score, [transposition_move] if transposition_move is not None else []
+
+		if depth <= 0:
+			return self.quiescence(ply, alpha, beta), []
+
+		color = board.get_turn_color()
+		# the transposition table move is tried first, the principal variation move when the table has none
+		if transposition_move is None and ply < len(self.principal_variation):
+			transposition_move = self.principal_variation[ply]
+		moves = generate_moves(board, color, transposition_move, self.killer_moves[ply], self.history)
+
+		original_alpha = alpha
+		best_score = -INFINITE_SCORE
+		best_line = []
+		for move in moves:
+			board.apply_move(move)
+			score, line = self.search_node(depth - 1, ply + 1, -beta, -alpha)
+			score = -score
+			board.undo_move()
+
+			if self.stopped and self.root_depth > 1:
+				return 0, []
+
+			if score > best_score:
+				best_score = score
+				best_line = [move] + line
+				if score > alpha:
+					alpha = score
+					if alpha >= beta:
+						if is_quiet_move(move):
+							self.store_killer_move(move, ply, depth)
+						break
+
+		if len(best_line) == 0:
+			return self.get_no_moves_score(color, ply), []
+
+		if best_score <= original_alpha:
+			bound = BOUND_UPPER
+		elif best_score >= beta:
+			bound = BOUND_LOWER
+		else:
+			bound = BOUND_EXACT
+		self.transposition_table.store(key, depth, bound, score_to_transposition(best_score, ply), best_line[0])
+
+		return best_score, best_line
+
+	# Searches captures until the position is quiet, so no leaf is evaluated in the middle of an exchange
+	# The side to move may stand pat on the evaluation, unless it is in check, when every evasion is searched
+	def quiescence(self, ply, alpha, beta):
+
+		self.nodes += 1
+		if self.nodes % SEARCH_CHECK_INTERVAL == 0:
+			self.check_limits()
+		if self.stopped and self.root_depth > 1:
+			return 0
+
+		board = self.board
+		color = board.get_turn_color()
+		legality = LegalityInfo(board, color)
+		in_check = legality.check_count > 0
+
+		if in_check:
+			stand_pat = -MATE_SCORE + ply
+			moves = generate_moves(board, color, legality = legality)
+		else:
+			stand_pat = evaluate(board)
+			if stand_pat >= beta:
+				return stand_pat
+			alpha = max(alpha, stand_pat)
+			moves = generate_captures(board, color, legality)
+
+		best_score = stand_pat
+		for move in moves:
+			if not in_check:
+				# delta pruning, not even winning the captured piece for free would lift the score to alpha
+				if move & MOVE_CODE_VALUE != PROMOTION_MOVE_BITS:
+					target_x, target_y = get_move_to(move)
+					target = board.board[target_x][target_y]
+					captured_value = EXCHANGE_PIECE_VALUES[target.type.value if target is not None else PieceType.PAWN.value]
+					if stand_pat + captured_value + QUIESCENCE_DELTA_MARGIN <= alpha:
+						continue
+				# captures that lose material once the exchange on the square is played out are not searched
+				if get_exchange_score(board, move) < 0:
+					continue
+
+			board.apply_move(move)
+			score = -self.quiescence(ply + 1, -beta, -alpha)
+			board.undo_move()
+
+			if self.stopped and self.root_depth > 1:
+				return 0
+
+			if score > best_score:
+				best_score = score
+				if score > alpha:
+					alpha = score
+					if alpha >= beta:
+						break
+
+		return best_score
+
+	# Score of a position without legal moves, mated if the side to move is in check and stalemate otherwise
+	def get_no_moves_score(self, color, ply):
+		king = self.board.get_king(color)
+		if king is not None and self.board.is_square_attacked(king.x, king.y, color):
+			return -MATE_SCORE + ply
+		return 0
+
+	# A quiet move that refuted a position is tried early in its siblings and gains history for the rest of the search
+	def store_killer_move(self, move, ply, depth):
+		killer_moves = self.killer_moves[ply]
+		if move not in killer_moves:
+			killer_moves.insert(0, move)
+			del killer_moves[SEARCH_KILLER_COUNT:]
+		self.history[get_history_index(move)] += depth * depth
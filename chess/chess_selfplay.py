@@ -0,0 +1,182 @@
+import contextlib
+import copy
+import json
+import os
+import random
+import time
+import multiprocessing
+import chess.chess_board as chess_board
+import chess.chess_search as chess_search
+import chess.utilities.fen as fen
+import chess.utilities.pgn as pgn
+import chess.utilities.polyglot as polyglot
+import chess.chess_tablebase as chess_tablebase
+from chess.chess_transposition import TranspositionTable
+from chess.chess_moves import get_move_string
+from chess.chess_enums import PieceColor
+from chess.chess_env import get_terminal_state, TERMINAL_NONE, TERMINAL_CHECKMATE, TERMINAL_STALEMATE, TERMINAL_FIFTY_MOVES,\
+	TERMINAL_INSUFFICIENT_MATERIAL, TERMINAL_REPETITION
+
+SELFPLAY_POLICIES = ["random", "engine"]
+
+TERMINATION_NAMES = {
+	TERMINAL_NONE: "move_limit",
+	TERMINAL_CHECKMATE: "checkmate",
+	TERMINAL_STALEMATE: "stalemate",
+	TERMINAL_FIFTY_MOVES: "fifty_moves",
+	TERMINAL_INSUFFICIENT_MATERIAL: "insufficient_material",
+	TERMINAL_REPETITION: "repetition",
+}
+
+DEFAULT_MAX_MOVES = 512
+
+# state of one worker process, set up once by init_worker so every game of the worker reuses it
+worker_settings = None
+worker_board = None
+worker_engine = None
+worker_book = None
+
+class SelfPlaySettings:
+
+	def __init__(self, policy = "random", max_moves = DEFAULT_MAX_MOVES, fen_string = fen.FEN_DEFAULT, seed = 0, depth = 64, move_time = 0.1, nodes = None, hash_mb = 16, record_san = False, book_path = None, tablebase_path = None):
+		if policy not in SELFPLAY_POLICIES:
+			raise Exception(f"Unknown self-play policy {policy}")
+		self.policy = policy
+		self.max_moves = max_moves
+		self.fen_string = fen_string
+		self.seed = seed
+		self.depth = depth
+		self.move_time = move_time
+		self.nodes = nodes
+		self.hash_mb = hash_mb
+		# games also keep their moves in SAN, which the PGN output needs
+		self.record_san = record_san
+		# Polyglot book the opening moves are drawn from, by weight, while the position is in the book
+		self.book_path = book_path
+		# directory of endgame tables the engine policy probes
+		self.tablebase_path = tablebase_path
+
+def init_worker(settings):
+
+	global worker_settings, worker_board, worker_engine, worker_book
+	worker_settings = settings
+	worker_board = chess_board.ChessBoard()
+	worker_engine = None
+	if settings.policy == "engine":
+		tablebase = chess_tablebase.Tablebase(settings.tablebase_path) if settings.tablebase_path is not None else None
+		worker_engine = chess_search.SearchEngine(settings.depth, settings.move_time, settings.nodes, TranspositionTable(settings.hash_mb), tablebase)
+	worker_book = polyglot.OpeningBook(settings.book_path) if settings.book_path is not None else None
+
+# Plays one game on board from settings.fen_string, returns the game as a dict ready to be written as JSON
+def play_game(board, settings, game_index, engine = None, book = None):
+
+	rng = random.Random(settings.seed * 1000003 + game_index)
+	board.reset_board()
+	fen.load_fen_to_board(board, settings.fen_string)
+	start_color = board.get_turn_color()
+
+	moves = []
+	san_moves = []
+	terminal_state = TERMINAL_NONE
+	in_book = book is not None
+	while len(moves) < settings.max_moves:
+		legal_moves = board.get_legal_moves(board.get_turn_color())
+		terminal_state = get_terminal_state(board, legal_moves)
+		if terminal_state != TERMINAL_NONE:
+			break
+
+		move = None
+		if in_book:
+			move = book.choose_move(board, rng)
+			# a game never returns to the book once it left it
+			in_book = move is not None
+		if move is None and engine is not None:
+			# a stale table from another game only costs time, it never changes the legality of a move
+			result = engine.search(board)
+			move = result.best_move if result is not None else None
+		if move is None:
+			move = rng.choice(legal_moves)
+
+		if settings.record_san:
+			san_moves.append(pgn.get_move_san(board, move))
+		board.apply_move(move)
+		moves.append(get_move_string(move))
+
+	# the last allowed ply may itself have ended the game
+	if terminal_state == TERMINAL_NONE:
+		terminal_state = get_terminal_state(board, board.get_legal_moves(board.get_turn_color()))
+
+	# the side to move has lost a checkmated position
+	if terminal_state == TERMINAL_CHECKMATE:
+		result = "0-1" if board.get_turn_color() == PieceColor.WHITE else "1-0"
+	elif terminal_state == TERMINAL_NONE:
+		result = "*"
+	else:
+		result = "1/2-1/2"
+
+	game = {
+		"game": game_index,
+		"fen": settings.fen_string,
+		"moves": moves,
+		"result": result,
+		"termination": TERMINATION_NAMES[terminal_state],
+		"length": len(moves),
+		"start_color": start_color.value,
+	}
+	if settings.record_san:
+		game["san"] = san_moves
+	return game
+
+def play_worker_game(game_index):
+	return play_game(worker_board, worker_settings, game_index, worker_engine, worker_book)
+
+def write_game_pgn(file, game, settings):
+
+	headers = {"Event": "Self-play", "Round": game["game"] + 1, "White": settings.policy, "Black": settings.policy, "Termination": game["termination"]}
+	if game["fen"] != fen.FEN_DEFAULT:
+		headers["SetUp"] = "1"
+		headers["FEN"] = game["fen"]
+	pgn.write_game(file, headers, game["san"], game["result"])
+
+# Plays games game indices on workers processes and appends each finished game as one JSON line to output_path
+# and as PGN to pgn_path when it is given. Games are written in the order they finish, on_game is called with every
+# game after it was written
+def run_selfplay(games, workers, settings, output_path, on_game = None, pgn_path = None):
+
+	workers = max(1, workers if workers is not None else os.cpu_count() or 1)
+	start_time = time.perf_counter()
+	stats = {"games": 0, "moves": 0, "results": {}}
+
+	# the PGN output needs SAN moves, the caller's settings are left as they are
+	if pgn_path is not None and not settings.record_san:
+		settings = copy.copy(settings)
+		settings.record_san = True
+
+	with open(output_path, "a") as output, (open(pgn_path, "a") if pgn_path is not None else contextlib.nullcontext()) as pgn_output:
+
+		def write_game(game):
+			output.write(json.dumps(game) + "\n")
+			output.flush()
+			if pgn_output is not None:
+				write_game_pgn(pgn_output, game, settings)
+				pgn_output.flush()
+			stats["games"] += 1
+			stats["moves"] += game["length"]
+			stats["results"][game["result"]] = stats["results"].get(game["result"], 0) + 1
+			if on_game is not None:
+				on_game(game)
+
+		if workers == 1:
+			init_worker(settings)
+			for game_index in range(games):
+				write_game(play_worker_game(game_index))
+		else:
+			# small chunks keep every worker busy until the end while still batching the inter process traffic
+			chunk_size = max(1, min(16, games // (workers * 8)))
+			with multiprocessing.Pool(workers, init_worker, (settings,)) as pool:
+				for game in pool.imap_unordered(play_worker_game, range(games), chunk_size):
+					write_game(game)
+
+	stats["elapsed"] = time.perf_counter() - start_time
+	stats["games_per_second"] = stats["games"] / stats["elapsed"] if stats["elapsed"] > 0 else 0.0
+	return stats
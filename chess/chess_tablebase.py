@@ -0,0 +1,239 @@
+import os
+import time
+import multiprocessing
+import numpy as np
+from chess.chess_enums import PieceType, PieceColor
+from chess.chess_attacks import KING_ATTACKS, KING_OFFSETS, PAWN_ATTACKS, ROOK_EMPTY_ATTACKS, BISHOP_EMPTY_ATTACKS, BETWEEN
+
+# Endgame tablebases of a king and one piece against a lone king, built by retrograde analysis
+#
+# A table holds one int16 per position indexed by get_table_index, always with white as the side that has the piece,
+# positions of the other color are mirrored before the lookup. The value is from the side to move, +(plies + 1) when
+# it mates in plies, -(plies + 1) when it gets mated in plies and TABLEBASE_DRAW when neither side can force a mate.
+
+TABLEBASE_SIZE = 2 * 64 * 64 * 64
+TABLEBASE_DRAW = 0
+TABLEBASE_ILLEGAL = np.iinfo(np.int16).min
+
+TABLEBASE_PIECE_TYPES = {"KQK": PieceType.QUEEN, "KRK": PieceType.ROOK, "KPK": PieceType.PAWN}
+TABLEBASE_NAMES = {piece_type: name for name, piece_type in TABLEBASE_PIECE_TYPES.items()}
+# tables the positions of a table turn into by promotion, they have to be built first
+TABLEBASE_DEPENDENCIES = {"KQK": [], "KRK": [], "KPK": ["KQK", "KRK"]}
+
+def get_table_index(turn, white_king, black_king, piece_square):
+	return ((turn * 64 + white_king) * 64 + black_king) * 64 + piece_square
+
+def get_table_path(directory, name):
+	return os.path.join(directory, name + ".npy")
+
+def get_square_matrix(attacks):
+	return np.array([[attacks[square] >> target & 1 for target in range(64)] for square in range(64)], dtype = bool)
+
+KING_MATRIX = get_square_matrix(KING_ATTACKS)
+WHITE_PAWN_MATRIX = get_square_matrix(PAWN_ATTACKS[PieceColor.WHITE.value])
+ROOK_LINE_MATRIX = get_square_matrix(ROOK_EMPTY_ATTACKS)
+BISHOP_LINE_MATRIX = get_square_matrix(BISHOP_EMPTY_ATTACKS)
+BETWEEN_MATRIX = np.array(BETWEEN, dtype = np.uint64)
+
+# RAY_TARGETS[square][direction][step] in the directions of KING_OFFSETS, rook directions first, -1 past the edge
+RAY_TARGETS = np.full((64, 8, 7), -1, dtype = np.int64)
+for square in range(64):
+	for direction, (dx, dy) in enumerate(KING_OFFSETS):
+		for step in range(7):
+			x, y = (square & 7) + dx * (step + 1), (square >> 3) + dy * (step + 1)
+			if 0 <= x <= 7 and 0 <= y <= 7:
+				RAY_TARGETS[square, direction, step] = y * 8 + x
+KING_TARGETS = RAY_TARGETS[:, :, 0]
+
+SLIDER_DIRECTIONS = {PieceType.QUEEN: range(8), PieceType.ROOK: range(4), PieceType.BISHOP: range(4, 8)}
+
+# Returns whether the white piece on piece_square attacks target when blocker is the only other piece that may stand in between
+def is_attacked(piece_type, piece_square, target, blocker):
+
+	if piece_type == PieceType.PAWN:
+		return WHITE_PAWN_MATRIX[piece_square, target]
+	if piece_type == PieceType.ROOK:
+		lines = ROOK_LINE_MATRIX[piece_square, target]
+	elif piece_type == PieceType.BISHOP:
+		lines = BISHOP_LINE_MATRIX[piece_square, target]
+	else:
+		lines = ROOK_LINE_MATRIX[piece_square, target] | BISHOP_LINE_MATRIX[piece_square, target]
+	blocked = (BETWEEN_MATRIX[piece_square, target] >> blocker.astype(np.uint64)) & np.uint64(1)
+	return lines & (blocked == 0)
+
+# Builds the table of one material from the tables of its dependencies, which promotions lead into
+def build_table(name, dependency_tables = None):
+
+	piece_type = TABLEBASE_PIECE_TYPES[name]
+	index = np.arange(TABLEBASE_SIZE, dtype = np.int64)
+	turn, white_king, black_king, piece_square = index >> 18, (index >> 12) & 63, (index >> 6) & 63, index & 63
+
+	legal = (white_king != black_king) & (white_king != piece_square) & (black_king != piece_square) & ~KING_MATRIX[white_king, black_king]
+	if piece_type == PieceType.PAWN:
+		legal &= (piece_square >> 3 >= 1) & (piece_square >> 3 <= 6)
+	# the side that just moved can not have left its king in check
+	black_in_check = is_attacked(piece_type, piece_square, black_king, white_king)
+	legal &= (turn == 1) | ~black_in_check
+
+	white_sources = index[legal & (turn == 0)]
+	black_sources = index[legal & (turn == 1)]
+
+	# MOVES OF WHITE, all of them lead to black to move positions of the same table except promotions
+	white_edges = []
+	wk, bk, ps = (white_sources >> 12) & 63, (white_sources >> 6) & 63, white_sources & 63
+	for direction in range(8):
+		target = KING_TARGETS[wk, direction]
+		valid = (target >= 0) & (target != ps) & (target != bk) & ~KING_MATRIX[np.maximum(target, 0), bk]
+		white_edges.append((white_sources[valid], get_table_index(1, target[valid], bk[valid], ps[valid])))
+
+	# promotions are won in one ply more than the black defeat they lead into, draws and underpromotions to minor pieces do not count
+	external_wins = np.full(TABLEBASE_SIZE, np.iinfo(np.int32).max, dtype = np.int64)
+	if piece_type == PieceType.PAWN:
+		one_step = ps + 8
+		empty = (one_step != wk) & (one_step != bk)
+		promotion = one_step >> 3 == 7
+		push = empty & ~promotion
+		white_edges.append((white_sources[push], get_table_index(1, wk[push], bk[push], one_step[push])))
+		double_push = push & (ps >> 3 == 1) & (ps + 16 != wk) & (ps + 16 != bk)
+		white_edges.append((white_sources[double_push], get_table_index(1, wk[double_push], bk[double_push], ps[double_push] + 16)))
+
+		promotion &= empty
+		promotion_index = get_table_index(1, wk[promotion], bk[promotion], one_step[promotion])
+		for dependency_table in (dependency_tables or {}).values():
+			values = dependency_table[promotion_index].astype(np.int64)
+			wins = np.where((values < 0) & (values != TABLEBASE_ILLEGAL), -values, external_wins[white_sources[promotion]])
+			external_wins[white_sources[promotion]] = np.minimum(external_wins[white_sources[promotion]], wins)
+	else:
+		for direction in SLIDER_DIRECTIONS[piece_type]:
+			open_ray = np.ones(len(white_sources), dtype = bool)
+			for step in range(7):
+				target = RAY_TARGETS[ps, direction, step]
+				open_ray &= (target >= 0) & (target != wk) & (target != bk)
+				white_edges.append((white_sources[open_ray], get_table_index(1, wk[open_ray], bk[open_ray], target[open_ray])))
+
+	# MOVES OF BLACK, king moves only, taking the piece draws
+	black_edges = []
+	move_counts = np.zeros(TABLEBASE_SIZE, dtype = np.int64)
+	wk, bk, ps = (black_sources >> 12) & 63, (black_sources >> 6) & 63, black_sources & 63
+	for direction in range(8):
+		target = KING_TARGETS[bk, direction]
+		safe_target = np.maximum(target, 0)
+		# the king no longer blocks the squares behind it once it moved
+		valid = (target >= 0) & (target != wk) & ~KING_MATRIX[safe_target, wk] & ~is_attacked(piece_type, ps, safe_target, wk)
+		move_counts[black_sources[valid]] += 1
+		quiet = valid & (target != ps)
+		black_edges.append((black_sources[quiet], get_table_index(0, wk[quiet], target[quiet], ps[quiet])))
+
+	white_source, white_target = [np.concatenate(edges).astype(np.int32) for edges in zip(*white_edges)]
+	black_source, black_target = [np.concatenate(edges).astype(np.int32) for edges in zip(*black_edges)]
+
+	# RETROGRADE ANALYSIS, one ply at a time from the mates
+	# white wins a ply after the first of its moves reaches a lost position, black loses once every one of its moves reaches a won one
+	values = np.zeros(TABLEBASE_SIZE, dtype = np.int16)
+	values[~legal] = TABLEBASE_ILLEGAL
+	lost = legal & (turn == 1) & (move_counts == 0) & black_in_check
+	values[lost] = -1
+	solved = lost | ~legal
+	remaining_moves = move_counts.copy()
+
+	external_wins[~legal] = np.iinfo(np.int32).max
+	last_external_win = external_wins[external_wins < np.iinfo(np.int32).max].max(initial = 0)
+	plies = 0
+	while True:
+		won = np.zeros(TABLEBASE_SIZE, dtype = bool)
+		won[white_source[lost[white_target]]] = True
+		won |= external_wins == plies + 1
+		won &= ~solved
+		values[won] = plies + 2
+		solved |= won
+
+		refuted_moves = np.bincount(black_source[won[black_target]], minlength = TABLEBASE_SIZE)
+		remaining_moves -= refuted_moves
+		lost = (remaining_moves == 0) & (refuted_moves > 0) & ~solved
+		values[lost] = -(plies + 3)
+		solved |= lost
+
+		plies += 2
+		if not won.any() and not lost.any() and plies >= last_external_win:
+			break
+
+	return values
+
+# Builds one table and saves it to directory, the tables it depends on have to be there already
+def generate_table(name, directory):
+
+	start_time = time.perf_counter()
+	dependency_tables = {dependency: np.load(get_table_path(directory, dependency)) for dependency in TABLEBASE_DEPENDENCIES[name]}
+	values = build_table(name, dependency_tables)
+	np.save(get_table_path(directory, name), values)
+	return {"name": name, "wins": int((values > 0).sum()), "losses": int(((values < 0) & (values != TABLEBASE_ILLEGAL)).sum()),
+		"longest_mate": int(values.max()) - 1, "elapsed": time.perf_counter() - start_time}
+
+# Builds the tables of names and what they depend on into directory on workers processes
+# Tables are built in rounds, every round builds the tables whose dependencies are done in parallel
+def generate_tablebases(directory, names = None, workers = None):
+
+	os.makedirs(directory, exist_ok = True)
+	pending = []
+	for name in (names if names is not None else list(TABLEBASE_PIECE_TYPES)):
+		for table in TABLEBASE_DEPENDENCIES[name] + [name]:
+			if table not in pending:
+				pending.append(table)
+
+	workers = max(1, workers if workers is not None else os.cpu_count() or 1)
+	stats = []
+	done = []
+	while len(pending) > 0:
+		ready = [name for name in pending if all(dependency in done for dependency in TABLEBASE_DEPENDENCIES[name])]
+		if workers == 1 or len(ready) == 1:
+			stats += [generate_table(name, directory) for name in ready]
+		else:
+			with multiprocessing.Pool(min(workers, len(ready))) as pool:
+				stats += pool.starmap(generate_table, [(name, directory) for name in ready])
+		done += ready
+		pending = [name for name in pending if name not in ready]
+	return stats
+
+# Tables of a directory, each memory mapped on its first probe
+class Tablebase:
+
+	def __init__(self, directory):
+		self.directory = directory
+		self.tables = {}
+
+	def get_table(self, name):
+		if name not in self.tables:
+			path = get_table_path(self.directory, name)
+			self.tables[name] = np.load(path, mmap_mode = "r") if os.path.exists(path) else None
+		return self.tables[name]
+
+	# Returns the table value of the position for the side to move, None when no table covers it
+	def probe(self, board):
+
+		if board.occupied_bitboard.bit_count() != 3 or any(board.get_castle_rights()):
+			return None
+
+		# the color with two pieces has the king and the piece
+		strong_color = PieceColor.WHITE if board.color_bitboards[PieceColor.WHITE.value].bit_count() == 2 else PieceColor.BLACK
+		strong_pieces = board.piece_bitboards[strong_color.value]
+		piece_type = None
+		for table_piece_type in TABLEBASE_NAMES:
+			if strong_pieces[table_piece_type.value]:
+				piece_type = table_piece_type
+		if piece_type is None:
+			return None
+		table = self.get_table(TABLEBASE_NAMES[piece_type])
+		if table is None:
+			return None
+
+		weak_color = PieceColor.BLACK if strong_color == PieceColor.WHITE else PieceColor.WHITE
+		strong_king = strong_pieces[PieceType.KING.value].bit_length() - 1
+		weak_king = board.piece_bitboards[weak_color.value][PieceType.KING.value].bit_length() - 1
+		piece_square = strong_pieces[piece_type.value].bit_length() - 1
+		turn = 0 if board.get_turn_color() == strong_color else 1
+		# tables have white as the strong side, black's pieces are mirrored onto white's half of the board
+		if strong_color == PieceColor.BLACK:
+			strong_king, weak_king, piece_square = strong_king ^ 56, weak_king ^ 56, piece_square ^ 56
+
+		value = int(table[get_table_index(turn, strong_king, weak_king, piece_square)])
+		return value if value != TABLEBASE_ILLEGAL else None
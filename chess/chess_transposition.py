@@ -0,0 +1,133 @@
+import numpy as np
+
+BOUND_NONE = 0
+BOUND_EXACT = 1
+BOUND_LOWER = 2
+BOUND_UPPER = 3
+
+# entries are grouped in buckets of this many slots, a key may live in any slot of its bucket
+TRANSPOSITION_BUCKET_SIZE = 2
+
+TRANSPOSITION_DEFAULT_SIZE_MB = 16
+
+class TranspositionEntry:
+
+	def __init__(self, key, depth, bound, score, move):
+		self.key = key
+		self.depth = depth
+		self.bound = bound
+		self.score = score
+		# None when no best move is known, move 0 (a1a1) never occurs so the table stores it as 0
+		self.move = move
+
+# Fixed size hash table of search results keyed by the position's Zobrist key
+# Every field lives in its own NumPy array so the memory use is fixed by size_mb for the life of the table
+class TranspositionTable:
+
+	def __init__(self, size_mb = TRANSPOSITION_DEFAULT_SIZE_MB):
+		self.resize(size_mb)
+
+	def resize(self, size_mb):
+
+		entry_size = 8 + 8 + 4 + 1 + 1 + 1
+		entry_count = max(TRANSPOSITION_BUCKET_SIZE, int(size_mb * 1024 * 1024) // entry_size)
+		# a power of two bucket count so a key maps to its bucket with a mask
+		bucket_count = 1 << ((entry_count // TRANSPOSITION_BUCKET_SIZE).bit_length() - 1)
+
+		self.size_mb = size_mb
+		self.bucket_mask = bucket_count - 1
+		self.entry_count = bucket_count * TRANSPOSITION_BUCKET_SIZE
+
+		self.keys = np.zeros(self.entry_count, dtype = np.uint64)
+		self.scores = np.zeros(self.entry_count, dtype = np.int64)
+		self.moves = np.zeros(self.entry_count, dtype = np.uint32)
+		self.depths = np.zeros(self.entry_count, dtype = np.int8)
+		self.bounds = np.zeros(self.entry_count, dtype = np.uint8)
+		self.ages = np.zeros(self.entry_count, dtype = np.uint8)
+
+		self.age = 0
+		self.clear_stats()
+
+	def clear(self):
+		self.keys.fill(0)
+		self.bounds.fill(BOUND_NONE)
+		self.age = 0
+		self.clear_stats()
+
+	def clear_stats(self):
+		self.probes = 0
+		self.hits = 0
+		self.stores = 0
+		self.replacements = 0
+
+	# Starts a new search, entries of older searches are the first to be replaced
+	def new_search(self):
+		self.age = (self.age + 1) & 0xFF
+
+	def get_bucket_index(self, key):
+		return (key & self.bucket_mask) * TRANSPOSITION_BUCKET_SIZE
+
+	# Returns the TranspositionEntry of the key or None
+	def probe(self, key):
+
+		self.probes += 1
+		index = self.get_bucket_index(key)
+		for slot in range(index, index + TRANSPOSITION_BUCKET_SIZE):
+			if self.bounds[slot] != BOUND_NONE and self.keys[slot] == key:
+				self.hits += 1
+				# refresh the entry so it survives the aging of the current search
+				self.ages[slot] = self.age
+				return TranspositionEntry(key, int(self.depths[slot]), int(self.bounds[slot]), int(self.scores[slot]), int(self.moves[slot]) or None)
+		return None
+
+	# Stores the entry in the bucket slot of the same key, an empty slot or the least valuable slot
+	# An entry is worth less when it comes from an older search or a shallower depth
+	def store(self, key, depth, bound, score, move = None):
+
+		self.stores += 1
+		index = self.get_bucket_index(key)
+
+		replace_slot = index
+		replace_value = None
+		for slot in range(index, index + TRANSPOSITION_BUCKET_SIZE):
+			if self.bounds[slot] == BOUND_NONE or self.keys[slot] == key:
+				replace_slot = slot
+				break
+			age_difference = (self.age - int(self.ages[slot])) & 0xFF
+			slot_value = int(self.depths[slot]) - 8 * age_difference
+			if replace_value is None or slot_value < replace_value:
+				replace_slot = slot
+				replace_value = slot_value
+		else:
+			self.replacements += 1
+
+		# keep the old best move when a bound without a move overwrites the same position
+		if move is None:
+			move = int(self.moves[replace_slot]) if self.keys[replace_slot] == key and self.bounds[replace_slot] != BOUND_NONE else 0
+
+		self.keys[replace_slot] = key
+		self.depths[replace_slot] = max(-128, min(127, depth))
+		self.bounds[replace_slot] = bound
+		self.scores[replace_slot] = score
+		self.moves[replace_slot] = move
+		self.ages[replace_slot] = self.age
+
+	def get_hit_rate(self):
+		return self.hits / self.probes if self.probes > 0 else 0.0
+
+	# Returns the share of used slots in a sample of the table, in permille like UCI hashfull
+	def get_hashfull(self):
+		sample = self.bounds[:min(1000, self.entry_count)]
+		return int(np.count_nonzero(sample) * 1000 // len(sample))
+
+	def get_stats(self):
+		return {
+			"size_mb": self.size_mb,
+			"entries": self.entry_count,
+			"probes": self.probes,
+			"hits": self.hits,
+			"hit_rate": self.get_hit_rate(),
+			"stores": self.stores,
+			"replacements": self.replacements,
+			"hashfull": self.get_hashfull(),
+		}
@@ -0,0 +1,62 @@
+import random
+from chess.chess_enums import PieceType, PieceColor
+from chess.chess_bitboard import square_bit
+
+# Zobrist keys, fixed by the seed so keys are stable between runs and processes
+ZOBRIST_SEED = 0x616E63686F7679
+
+zobrist_random = random.Random(ZOBRIST_SEED)
+
+# PIECE_KEYS[color][type][square]
+PIECE_KEYS = [[[zobrist_random.getrandbits(64) for square in range(64)] for piece_type in PieceType] for piece_color in PieceColor]
+
+# one key per castle right, in the order of ChessBoard.get_castle_rights
+CASTLE_RIGHT_KEYS = [zobrist_random.getrandbits(64) for i in range(4)]
+EN_PASSANT_FILE_KEYS = [zobrist_random.getrandbits(64) for i in range(8)]
+BLACK_TO_MOVE_KEY = zobrist_random.getrandbits(64)
+
+# CASTLE_KEYS[rights] for every combination of the four rights as a bit mask
+CASTLE_KEYS = [0] * 16
+for castle_mask in range(16):
+	for i in range(4):
+		if castle_mask & (1 << i):
+			CASTLE_KEYS[castle_mask] ^= CASTLE_RIGHT_KEYS[i]
+
+def get_castle_key(castle_rights):
+	castle_mask = 0
+	for i in range(4):
+		if castle_rights[i]:
+			castle_mask |= 1 << i
+	return CASTLE_KEYS[castle_mask]
+
+# The en passant file only counts when the side to move has a pawn that can capture there,
+# otherwise the position is the same as without the target
+def get_en_passant_key(board):
+
+	if board.en_passant_target is None:
+		return 0
+
+	target_x, target_y = board.en_passant_target
+	color = board.get_turn_color()
+	pawn_y = target_y - 1 if color == PieceColor.WHITE else target_y + 1
+	pawns = board.piece_bitboards[color.value][PieceType.PAWN.value]
+
+	if (target_x > 0 and pawns & square_bit(target_x - 1, pawn_y)) or (target_x < 7 and pawns & square_bit(target_x + 1, pawn_y)):
+		return EN_PASSANT_FILE_KEYS[target_x]
+	return 0
+
+# Computes the key of a position from scratch, ChessBoard keeps it up to date incrementally afterwards
+def compute_key(board):
+
+	key = 0
+	for x in range(board.board_width):
+		for y in range(board.board_height):
+			piece = board.board[x][y]
+			if piece is not None:
+				key ^= PIECE_KEYS[piece.color.value][piece.type.value][y * 8 + x]
+
+	key ^= get_castle_key(board.get_castle_rights())
+	key ^= get_en_passant_key(board)
+	if board.get_turn_color() == PieceColor.BLACK:
+		key ^= BLACK_TO_MOVE_KEY
+	return key
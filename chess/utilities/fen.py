@@ -1,42 +1,35 @@
 import chess.chess_piece as chess_piece
+import chess.chess_zobrist as chess_zobrist
+import chess.chess_evaluation as chess_evaluation
 from chess.chess_enums import PieceType, PieceColor, MoveCode
 
 FEN_DEFAULT = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 
+FEN_PIECE_CHARS = {
+	PieceType.PAWN: "p",
+	PieceType.KNIGHT: "n",
+	PieceType.BISHOP: "b",
+	PieceType.ROOK: "r",
+	PieceType.QUEEN: "q",
+	PieceType.KING: "k",
+}
+
+# (color, type) of every piece character, white pieces are upper case
+FEN_PIECES = {}
+for piece_type, fen_char in FEN_PIECE_CHARS.items():
+	FEN_PIECES[fen_char.upper()] = (PieceColor.WHITE, piece_type)
+	FEN_PIECES[fen_char] = (PieceColor.BLACK, piece_type)
+FEN_PIECE_VALUES = {fen_char: (piece_color.value, piece_type.value) for fen_char, (piece_color, piece_type) in FEN_PIECES.items()}
+
 def get_piece_from_fen_char(fen_char):
-	piece_color = PieceColor.WHITE
-	piece_type = PieceType.PAWN
-	if fen_char.islower():
-		piece_color = PieceColor.BLACK
-	if fen_char.lower() == "p":
-		piece_type = PieceType.PAWN
-	elif fen_char.lower() == "n":
-		piece_type = PieceType.KNIGHT
-	elif fen_char.lower() == "b":
-		piece_type = PieceType.BISHOP
-	elif fen_char.lower() == "r":
-		piece_type = PieceType.ROOK
-	elif fen_char.lower() == "q":
-		piece_type = PieceType.QUEEN
-	elif fen_char.lower() == "k":
-		piece_type = PieceType.KING
-	else:
+	if fen_char not in FEN_PIECES:
 		raise Exception("Invalid fen character: " + fen_char)
+	piece_color, piece_type = FEN_PIECES[fen_char]
 	return chess_piece.ChessPiece(piece_color, piece_type, 0, 0)
 
 def get_fen_char(piece):
-	fen_char = "p"
-	if piece.type == PieceType.KNIGHT:
-		fen_char = "n"
-	elif piece.type == PieceType.BISHOP:
-		fen_char = "b"
-	elif piece.type == PieceType.ROOK:
-		fen_char = "r"
-	elif piece.type == PieceType.QUEEN:
-		fen_char = "q"
-	elif piece.type == PieceType.KING:
-		fen_char = "k"
-	if piece.color == PieceColor.BLACK:
+	fen_char = FEN_PIECE_CHARS[piece.type]
+	if piece.color == PieceColor.WHITE:
 		fen_char = fen_char.upper()
 	return fen_char
 
@@ -44,9 +37,20 @@ def get_fen_parts(fen):
 	return fen.split(" ")
 
 def convert_board_to_fen(chess_board):
+	# PART 1 - 4
+	fen = get_position_fen(chess_board)
+	# PART 5
+	half_move_fen = str(chess_board.half_move_clock)
+	# PART 6
+	full_move_number_fen = str(chess_board.round // 2 + 1)
+	return f"{fen} {half_move_fen} {full_move_number_fen}"
+
+# Returns the first four FEN fields, which are also the position of an EPD record
+def get_position_fen(chess_board):
 	# PART 1
-	board_fen = ""
-	for y in range(chess_board.board_height):
+	rows = []
+	for y in range(chess_board.board_height - 1, -1, -1):
+		row = ""
 		empty_tile_count = 0
 		for x in range(chess_board.board_width):
 			piece = chess_board.board[x][y]
@@ -54,13 +58,13 @@ def convert_board_to_fen(chess_board):
 				empty_tile_count += 1
 			else:
 				if empty_tile_count > 0:
-					board_fen += str(empty_tile_count)
+					row += str(empty_tile_count)
 					empty_tile_count = 0
-				board_fen += piece.get_fen()
+				row += get_fen_char(piece)
 		if empty_tile_count > 0:
-			board_fen += str(empty_tile_count)
-		if y < chess_board.board_height - 1:
-			board_fen += "/"
+			row += str(empty_tile_count)
+		rows.append(row)
+	board_fen = "/".join(rows)
 	# PART 2
 	turn_fen = "w" if chess_board.round % 2 == 0 else "b"
 	# PART 3
@@ -73,35 +77,132 @@ def convert_board_to_fen(chess_board):
 		castling_fen += "k"
 	if chess_board.black_can_castle_queenside:
 		castling_fen += "q"
+	if castling_fen == "":
+		castling_fen = "-"
 	# PART 4
 	en_passant_target_fen = "-"
 	if chess_board.en_passant_target is not None:
 		en_passant_target_fen = chess_board.get_coordinate_string(chess_board.en_passant_target[0], chess_board.en_passant_target[1])
-	# PART 5
-	half_move_fen = str(chess_board.half_move_clock)
-	# PART 6
-	full_move_number_fen = str(chess_board.round // 2 + 1)
+	return f"{board_fen} {turn_fen} {castling_fen} {en_passant_target_fen}"
+
+# Returns the EPD record of the board, operations maps opcodes to an operand or a list of operands
+def convert_board_to_epd(chess_board, operations = None):
 
+	epd = get_position_fen(chess_board)
+	if operations is None:
+		operations = {"hmvc": chess_board.half_move_clock, "fmvn": chess_board.round // 2 + 1}
+	for opcode, operands in operations.items():
+		if not isinstance(operands, list):
+			operands = [operands]
+		operand_strings = [f'"{operand}"' if isinstance(operand, str) and (" " in operand or operand == "") else str(operand) for operand in operands]
+		epd += " " + " ".join([opcode] + operand_strings) + ";"
+	return epd
 
+# Returns the opcodes of EPD operations mapped to their list of operands, quoted operands may hold spaces and semicolons
+def parse_epd_operations(operations_string):
+
+	operations = {}
+	tokens = []
+	token = None
+	quoted = False
+	for char in operations_string + ";":
+		if quoted:
+			if char == '"':
+				quoted = False
+				tokens.append(token)
+				token = None
+			else:
+				token += char
+		elif char == '"':
+			quoted = True
+			token = ""
+		elif char == ";" or char.isspace():
+			if token is not None:
+				tokens.append(token)
+				token = None
+			if char == ";" and len(tokens) > 0:
+				operations[tokens[0]] = tokens[1:]
+				tokens = []
+		else:
+			token = char if token is None else token + char
+	return operations
 
 def load_fen_to_board(chess_board, fen):
 
 	board_fen, turn_fen, castling_fen, en_passant_target_fen, half_move_fen, full_move_number_fen = get_fen_parts(fen)
+	load_fen_fields_to_board(chess_board, board_fen, turn_fen, castling_fen, en_passant_target_fen, int(half_move_fen), int(full_move_number_fen))
+
+# Loads an EPD record and returns its operations, the clocks come from the hmvc and fmvn operations when present
+def load_epd_to_board(chess_board, epd):
+
+	board_fen, turn_fen, castling_fen, en_passant_target_fen, *rest = epd.split(None, 4)
+	operations = parse_epd_operations(rest[0]) if len(rest) > 0 else {}
+	half_move_clock = int(operations["hmvc"][0]) if "hmvc" in operations else 0
+	full_move_number = int(operations["fmvn"][0]) if "fmvn" in operations else 1
+	load_fen_fields_to_board(chess_board, board_fen, turn_fen, castling_fen, en_passant_target_fen, half_move_clock, full_move_number)
+	return operations
+
+# Loads a FEN or EPD line and returns the EPD operations, empty for FEN
+def load_position_to_board(chess_board, line):
+
+	parts = line.split()
+	if len(parts) == 6 and parts[4].isdigit() and parts[5].isdigit():
+		load_fen_fields_to_board(chess_board, parts[0], parts[1], parts[2], parts[3], int(parts[4]), int(parts[5]))
+		return {}
+	return load_epd_to_board(chess_board, line)
+
+# Yields (chess_board, operations) for every FEN or EPD line of source, a path or an open text file
+# Lines are read lazily and every position is loaded into the same board, copy it if it has to outlive the iteration
+def read_positions(source, chess_board = None):
+
+	if chess_board is None:
+		import chess.chess_board
+		chess_board = chess.chess_board.ChessBoard()
+
+	file = open(source) if isinstance(source, str) else source
+	try:
+		for line in file:
+			line = line.strip()
+			if line == "" or line.startswith("#"):
+				continue
+			operations = load_position_to_board(chess_board, line)
+			yield chess_board, operations
+	finally:
+		if file is not source:
+			file.close()
+
+def load_fen_fields_to_board(chess_board, board_fen, turn_fen, castling_fen, en_passant_target_fen, half_move_clock, full_move_number):
+
+	chess_board.clear_history()
 	# PART 1
-	board_rows = board_fen.split("/")
-	chess_board.board = [[None for i in range(chess_board.board_width)] for j in range(chess_board.board_height)]
-	position = (0, chess_board.board_height)
-	for row in board_rows:
-		position = (0, position[1] - 1)
-		for char in row:
-			if char.isdigit():
-				position = (position[0] + int(char), position[1])
-			else:
-				piece = get_piece_from_fen_char(char)
-				piece.x = position[0]
-				piece.y = position[1]
-				chess_board.board[piece.x][piece.y] = piece
-				position = (position[0] + 1, position[1])
+	# the board was just cleared, so the pieces go straight into the squares and masks instead of through set_piece
+	chess_board.clear_board()
+	board = chess_board.board
+	piece_bitboards = chess_board.piece_bitboards
+	key = 0
+	y = chess_board.board_height - 1
+	x = 0
+	for char in board_fen:
+		if char == "/":
+			y -= 1
+			x = 0
+		elif char.isdigit():
+			x += int(char)
+		else:
+			if char not in FEN_PIECES:
+				raise Exception("Invalid fen character: " + char)
+			piece_color, piece_type = FEN_PIECES[char]
+			color_value, type_value = FEN_PIECE_VALUES[char]
+			board[x][y] = chess_piece.ChessPiece(piece_color, piece_type, x, y)
+			piece_bitboards[color_value][type_value] |= 1 << (y * 8 + x)
+			key ^= chess_zobrist.PIECE_KEYS[color_value][type_value][y * 8 + x]
+			x += 1
+
+	for color_value in range(len(piece_bitboards)):
+		for piece_bitboard in piece_bitboards[color_value]:
+			chess_board.color_bitboards[color_value] |= piece_bitboard
+	chess_board.occupied_bitboard = chess_board.color_bitboards[0] | chess_board.color_bitboards[1]
+	chess_board.midgame_score, chess_board.endgame_score, chess_board.phase = chess_evaluation.compute_scores(chess_board)
 
 	# PART 2
 	chess_board.round = 0 if turn_fen == "w" else 1
@@ -116,8 +217,10 @@ def load_fen_to_board(chess_board, fen):
 	else:
 		chess_board.en_passant_target = None
 	# PART 5
-	chess_board.half_move_clock = int(half_move_fen)
+	chess_board.half_move_clock = half_move_clock
 	# PART 6
-	chess_board.round += (int(full_move_number_fen) - 1) * 2
+	chess_board.round += (full_move_number - 1) * 2
 
-	
+	chess_board.zobrist_key = key ^ chess_zobrist.get_castle_key(chess_board.get_castle_rights()) ^ chess_zobrist.get_en_passant_key(chess_board)
+	if chess_board.round % 2 == 1:
+		chess_board.zobrist_key ^= chess_zobrist.BLACK_TO_MOVE_KEY
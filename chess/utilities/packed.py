@@ -0,0 +1,169 @@
+import numpy as np
+import chess.chess_piece as chess_piece
+import chess.chess_zobrist as chess_zobrist
+from chess.chess_enums import PieceType, PieceColor
+from chess.chess_bitboard import iterate_squares
+
+# Fixed width 32 byte position records, a dataset file is nothing but these records one after another
+#
+# occupied          bitboard of the occupied squares
+# pieces            one nibble per occupied square in square order, low nibble first, color * 8 + type
+# flags             bit 0 black to move, bits 1-4 the castle rights in the order of ChessBoard.get_castle_rights
+# en_passant        en passant target square or PACKED_NO_SQUARE
+# half_move_clock   capped at 255
+# full_move_number
+# score, result     free for training labels, the score in centipawns and 1, 0, -1 for a white win, draw or black win
+POSITION_DTYPE = np.dtype([
+	("occupied", "<u8"),
+	("pieces", "u1", (16,)),
+	("flags", "u1"),
+	("en_passant", "u1"),
+	("half_move_clock", "u1"),
+	("full_move_number", "<u2"),
+	("score", "<i2"),
+	("result", "i1"),
+])
+
+PACKED_NO_SQUARE = 0xFF
+
+# positions gathered by PositionWriter before they are written out
+PACKED_WRITE_BUFFER_SIZE = 4096
+
+# Writes board into positions[index]
+def pack_board_into(positions, index, board, score = 0, result = 0):
+
+	if board.occupied_bitboard.bit_count() > 32:
+		raise Exception("Can not pack a position with more than 32 pieces")
+
+	pieces = np.zeros(16, dtype = np.uint8)
+	for i, square in enumerate(iterate_squares(board.occupied_bitboard)):
+		piece = board.board[square & 7][square >> 3]
+		pieces[i >> 1] |= (piece.color.value * 8 + piece.type.value) << ((i & 1) * 4)
+
+	flags = board.get_turn_color().value
+	for i, castle_right in enumerate(board.get_castle_rights()):
+		flags |= castle_right << (i + 1)
+
+	record = positions[index]
+	record["occupied"] = board.occupied_bitboard
+	record["pieces"] = pieces
+	record["flags"] = flags
+	record["en_passant"] = PACKED_NO_SQUARE if board.en_passant_target is None else board.en_passant_target[1] * 8 + board.en_passant_target[0]
+	record["half_move_clock"] = min(255, board.half_move_clock)
+	record["full_move_number"] = board.round // 2 + 1
+	record["score"] = score
+	record["result"] = result
+
+def pack_board(board, score = 0, result = 0):
+	positions = np.zeros(1, dtype = POSITION_DTYPE)
+	pack_board_into(positions, 0, board, score, result)
+	return positions[0]
+
+# Loads a packed position into board, like fen.load_fen_to_board it replaces the board's position and history
+def unpack_board(record, board):
+
+	board.clear_history()
+	board.clear_board()
+	pieces = record["pieces"]
+	for i, square in enumerate(iterate_squares(int(record["occupied"]))):
+		code = (int(pieces[i >> 1]) >> ((i & 1) * 4)) & 0xF
+		board.set_piece(square & 7, square >> 3, chess_piece.ChessPiece(PieceColor(code >> 3), PieceType(code & 7), 0, 0))
+
+	flags = int(record["flags"])
+	board.round = (int(record["full_move_number"]) - 1) * 2 + (flags & 1)
+	board.set_castle_rights(tuple(bool(flags >> (i + 1) & 1) for i in range(4)))
+	en_passant = int(record["en_passant"])
+	board.en_passant_target = None if en_passant == PACKED_NO_SQUARE else (en_passant & 7, en_passant >> 3)
+	board.half_move_clock = int(record["half_move_clock"])
+	board.zobrist_key = chess_zobrist.compute_key(board)
+	return board
+
+# Returns a (n, 64) int8 array of the pieces of packed positions in the encoding of chess_batch
+def unpack_pieces(positions):
+
+	size = len(positions)
+	occupied = np.unpackbits(np.ascontiguousarray(positions["occupied"]).view(np.uint8).reshape(size, 8), axis = 1, bitorder = "little").astype(bool)
+	packed = positions["pieces"]
+	nibbles = np.empty((size, 32), dtype = np.uint8)
+	nibbles[:, 0::2] = packed & 0xF
+	nibbles[:, 1::2] = packed >> 4
+
+	# the n-th occupied square holds the n-th nibble
+	nibble_index = np.cumsum(occupied, axis = 1) - 1
+	codes = np.take_along_axis(nibbles, np.clip(nibble_index, 0, 31), axis = 1).astype(np.int8)
+	batch_pieces = np.where(codes >= 8, -((codes & 7) + 1), codes + 1).astype(np.int8)
+	return np.where(occupied, batch_pieces, 0).astype(np.int8)
+
+# Returns a BatchBoard holding the packed positions
+def unpack_batch(positions):
+
+	from chess.chess_batch import BatchBoard
+	batch = BatchBoard(len(positions))
+	flags = positions["flags"]
+	batch.pieces[:] = unpack_pieces(positions)
+	batch.turn[:] = flags & 1
+	batch.castle_rights[:] = (flags[:, None] >> np.arange(1, 5)) & 1
+	batch.en_passant[:] = np.where(positions["en_passant"] == PACKED_NO_SQUARE, -1, positions["en_passant"])
+	batch.half_move_clock[:] = positions["half_move_clock"]
+	batch.round[:] = (positions["full_move_number"].astype(np.int32) - 1) * 2 + (flags & 1)
+	return batch
+
+# Returns the packed positions of every position of a BatchBoard
+def pack_batch(batch, scores = 0, results = 0):
+
+	size = batch.size
+	occupied = batch.pieces != 0
+	if (occupied.sum(axis = 1) > 32).any():
+		raise Exception("Can not pack a position with more than 32 pieces")
+
+	positions = np.zeros(size, dtype = POSITION_DTYPE)
+	positions["occupied"] = np.packbits(occupied, axis = 1, bitorder = "little").view("<u8")[:, 0]
+
+	# the occupied squares in square order, each row padded with empty nibbles
+	codes = np.where(batch.pieces > 0, batch.pieces - 1, 8 - batch.pieces - 1).astype(np.uint8)
+	order = np.argsort(~occupied, axis = 1, kind = "stable")
+	nibbles = np.where(np.take_along_axis(occupied, order, axis = 1), np.take_along_axis(codes, order, axis = 1), 0)[:, :32]
+	positions["pieces"] = nibbles[:, 0::2] | (nibbles[:, 1::2] << 4)
+
+	positions["flags"] = batch.turn.astype(np.uint8) | (batch.castle_rights.astype(np.uint8) << np.arange(1, 5, dtype = np.uint8)).sum(axis = 1, dtype = np.uint8)
+	positions["en_passant"] = np.where(batch.en_passant < 0, PACKED_NO_SQUARE, batch.en_passant)
+	positions["half_move_clock"] = np.minimum(batch.half_move_clock, 255)
+	positions["full_move_number"] = batch.round // 2 + 1
+	positions["score"] = scores
+	positions["result"] = results
+	return positions
+
+# Returns the positions of a dataset file as a memory mapped structured array, records are read from disk on access
+def open_positions(path, mode = "r"):
+	return np.memmap(path, dtype = POSITION_DTYPE, mode = mode)
+
+# Appends packed positions to a dataset file, buffering them into larger writes
+class PositionWriter:
+
+	def __init__(self, path, append = True):
+		self.file = open(path, "ab" if append else "wb")
+		self.buffer = np.zeros(PACKED_WRITE_BUFFER_SIZE, dtype = POSITION_DTYPE)
+		self.buffered = 0
+		self.written = 0
+
+	def write(self, board, score = 0, result = 0):
+		pack_board_into(self.buffer, self.buffered, board, score, result)
+		self.buffered += 1
+		if self.buffered == len(self.buffer):
+			self.flush()
+
+	def write_positions(self, positions):
+		self.flush()
+		np.asarray(positions, dtype = POSITION_DTYPE).tofile(self.file)
+		self.written += len(positions)
+
+	def flush(self):
+		if self.buffered > 0:
+			self.buffer[:self.buffered].tofile(self.file)
+			self.written += self.buffered
+			self.buffered = 0
+		self.file.flush()
+
+	def close(self):
+		self.flush()
+		self.file.close()
@@ -0,0 +1,243 @@
+import re
+import chess.utilities.fen as fen
+from chess.chess_enums import PieceType, MoveCode
+from chess.chess_moves import decode_move, get_from_square, get_to_square, get_promotion_type, castle
+from chess.chess_legality import LegalityInfo
+from chess.chess_bitboard import iterate_squares
+
+SAN_PIECE_CHARS = {PieceType.KNIGHT: "N", PieceType.BISHOP: "B", PieceType.ROOK: "R", PieceType.QUEEN: "Q", PieceType.KING: "K"}
+SAN_PIECE_TYPES = {piece_char: piece_type for piece_type, piece_char in SAN_PIECE_CHARS.items()}
+
+# piece, from file, from rank, capture, target square and promotion of a SAN move without its check and annotation suffix
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=?([NBRQ]))?$")
+
+PGN_RESULTS = ["1-0", "0-1", "1/2-1/2", "*"]
+PGN_HEADER_PATTERN = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+PGN_TOKEN_PATTERN = re.compile(r"\{|\}|\(|\)|;|\$\d+|[^\s{}();]+")
+PGN_MOVE_NUMBER_PATTERN = re.compile(r"^\d+\.+")
+PGN_SEVEN_TAG_ROSTER = ["Event", "Site", "Date", "Round", "White", "Black", "Result"]
+PGN_LINE_LENGTH = 79
+
+# Returns the legal moves of the color's pieces of one type, optionally only of the pieces on a file or rank
+def get_piece_type_moves(board, color, piece_type, legality, from_x = None, from_y = None):
+
+	moves = []
+	for square in iterate_squares(board.piece_bitboards[color.value][piece_type.value]):
+		x, y = square & 7, square >> 3
+		if (from_x is None or x == from_x) and (from_y is None or y == from_y):
+			moves.extend(board.board[x][y].get_legal_moves(board, True, legality))
+	return moves
+
+# Returns the standard algebraic notation of a legal move of the side to move, such as Nbd7, exd6, e8=Q or O-O+
+def get_move_san(board, move, legality = None):
+
+	move_code, piece_x, piece_y, x, y, promotion_type = decode_move(move)
+	color = board.get_turn_color()
+
+	if move_code == MoveCode.CASTLE_CODE:
+		san = "O-O" if x == 6 else "O-O-O"
+	else:
+		piece = board.board[piece_x][piece_y]
+		capture = move_code == MoveCode.CAPTURE_CODE or move_code == MoveCode.EN_PASSANT_CODE or board.board[x][y] is not None
+		target = board.get_coordinate_string(x, y)
+
+		if piece.type == PieceType.PAWN:
+			san = (chr(piece_x + 97) + "x" if capture else "") + target
+			if promotion_type is not None:
+				san += "=" + SAN_PIECE_CHARS[promotion_type]
+		else:
+			# name the file, the rank or both when another piece of the same type can go to the same square
+			if legality is None:
+				legality = LegalityInfo(board, color)
+			others = [get_from_square(other) for other in get_piece_type_moves(board, color, piece.type, legality)
+				if get_to_square(other) == get_to_square(move) and get_from_square(other) != get_from_square(move)]
+			disambiguation = ""
+			if len(others) > 0:
+				if all(other & 7 != piece_x for other in others):
+					disambiguation = chr(piece_x + 97)
+				elif all(other >> 3 != piece_y for other in others):
+					disambiguation = str(piece_y + 1)
+				else:
+					disambiguation = chr(piece_x + 97) + str(piece_y + 1)
+			san = SAN_PIECE_CHARS[piece.type] + disambiguation + ("x" if capture else "") + target
+
+	board.apply_move(move)
+	enemy_color = board.get_turn_color()
+	king = board.get_king(enemy_color)
+	if king is not None and board.is_square_attacked(king.x, king.y, enemy_color):
+		san += "#" if len(board.get_legal_moves(enemy_color)) == 0 else "+"
+	board.undo_move()
+
+	return san
+
+# Returns the legal move of the side to move written in standard algebraic notation
+def parse_san(board, san, legality = None):
+
+	color = board.get_turn_color()
+	if legality is None:
+		legality = LegalityInfo(board, color)
+
+	san = san.rstrip("+#!?")
+	if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+		king = board.get_king(color)
+		if king is not None:
+			move = castle(king, 6 if len(san) == 3 else 2, king.y)
+			if move in king.get_legal_moves(board, True, legality):
+				return move
+		raise Exception(f"Illegal SAN move {san}")
+
+	match = SAN_PATTERN.match(san)
+	if match is None:
+		raise Exception(f"Invalid SAN move {san}")
+
+	piece_char, from_file, from_rank, capture, target, promotion_char = match.groups()
+	piece_type = SAN_PIECE_TYPES[piece_char] if piece_char is not None else PieceType.PAWN
+	from_x = ord(from_file) - 97 if from_file is not None else None
+	from_y = int(from_rank) - 1 if from_rank is not None else None
+	target_square = (int(target[1]) - 1) * 8 + ord(target[0]) - 97
+	promotion_type = SAN_PIECE_TYPES[promotion_char] if promotion_char is not None else None
+
+	candidates = [move for move in get_piece_type_moves(board, color, piece_type, legality, from_x, from_y)
+		if get_to_square(move) == target_square and get_promotion_type(move) == promotion_type]
+
+	if len(candidates) != 1:
+		raise Exception(f"{'Ambiguous' if len(candidates) > 1 else 'Illegal'} SAN move {san}")
+	return candidates[0]
+
+# Returns the SAN of moves played one after another from the board's position, the board is left as it was found
+def get_san_moves(board, moves):
+
+	san_moves = []
+	for move in moves:
+		san_moves.append(get_move_san(board, move))
+		board.apply_move(move)
+	for move in moves:
+		board.undo_move()
+	return san_moves
+
+class PgnGame:
+
+	def __init__(self, headers = None, moves = None, result = "*"):
+		self.headers = headers if headers is not None else {}
+		# SAN moves of the main line
+		self.moves = moves if moves is not None else []
+		self.result = result
+
+	def get_start_fen(self):
+		return self.headers.get("FEN", fen.FEN_DEFAULT)
+
+	def __str__(self):
+		return convert_game_to_pgn(self.headers, self.moves, self.result)
+
+# Yields (board, move) for every move of the game with board in the position before move
+# The move is made when the generator resumes, so the board ends in the final position of the game
+def replay_game(game, board = None):
+
+	if board is None:
+		import chess.chess_board
+		board = chess.chess_board.ChessBoard()
+
+	fen.load_fen_to_board(board, game.get_start_fen())
+	for san in game.moves:
+		move = parse_san(board, san)
+		yield board, move
+		board.apply_move(move)
+
+# Yields the PgnGame of every game of source, a path or an open text file
+# Only the game being read is held in memory, comments, variations and NAGs are skipped
+def read_games(source):
+
+	file = open(source) if isinstance(source, str) else source
+	try:
+		game = None
+		comment = False
+		variation_depth = 0
+		for line in file:
+			if not comment and line.startswith("%"):
+				continue
+
+			if not comment and line.startswith("["):
+				header = PGN_HEADER_PATTERN.match(line)
+				if header is not None:
+					# headers after movetext start the next game of a file without results
+					if game is not None and len(game.moves) > 0:
+						yield game
+						game = None
+					if game is None:
+						game = PgnGame()
+					game.headers[header.group(1)] = header.group(2)
+					continue
+
+			for token in PGN_TOKEN_PATTERN.findall(line):
+				if comment:
+					comment = token != "}"
+				elif token == "{":
+					comment = True
+				elif token == ";":
+					break
+				elif token == "(":
+					variation_depth += 1
+				elif token == ")":
+					variation_depth -= 1
+				elif variation_depth > 0 or token.startswith("$"):
+					continue
+				elif token in PGN_RESULTS:
+					if game is None:
+						game = PgnGame()
+					game.result = token
+					yield game
+					game = None
+				else:
+					token = PGN_MOVE_NUMBER_PATTERN.sub("", token)
+					if token != "":
+						if game is None:
+							game = PgnGame()
+						game.moves.append(token)
+
+		if game is not None and (len(game.moves) > 0 or len(game.headers) > 0):
+			yield game
+	finally:
+		if file is not source:
+			file.close()
+
+# Returns the PGN text of a game, the seven tag roster is filled with "?" where headers has no value
+def convert_game_to_pgn(headers, san_moves, result = "*"):
+
+	headers = dict(headers)
+	headers["Result"] = result
+	lines = []
+	for tag in PGN_SEVEN_TAG_ROSTER:
+		lines.append(f'[{tag} "{headers.get(tag, "?")}"]')
+	for tag, value in headers.items():
+		if tag not in PGN_SEVEN_TAG_ROSTER:
+			lines.append(f'[{tag} "{value}"]')
+	lines.append("")
+
+	# move numbers continue from the FEN header when the game does not start from the initial position
+	start_fen = headers.get("FEN", fen.FEN_DEFAULT)
+	start_parts = fen.get_fen_parts(start_fen)
+	ply = (int(start_parts[5]) - 1) * 2 + (1 if start_parts[1] == "b" else 0)
+
+	tokens = []
+	for i, san in enumerate(san_moves):
+		if ply % 2 == 0:
+			tokens.append(f"{ply // 2 + 1}.")
+		elif i == 0:
+			tokens.append(f"{ply // 2 + 1}...")
+		tokens.append(san)
+		ply += 1
+	tokens.append(result)
+
+	line = ""
+	for token in tokens:
+		if len(line) + len(token) + 1 > PGN_LINE_LENGTH:
+			lines.append(line)
+			line = token
+		else:
+			line = token if line == "" else line + " " + token
+	lines.append(line)
+
+	return "\n".join(lines) + "\n"
+
+def write_game(file, headers, san_moves, result = "*"):
+	file.write(convert_game_to_pgn(headers, san_moves, result) + "\n")
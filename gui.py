@@ -1,6 +1,13 @@
+import copy
+import queue
+import threading
 import tkinter as tk
 import numpy as np
+import chess.chess_search as chess_search
+from chess.chess_move_cache import MoveCache
+from chess.chess_board import HISTORY_DEFAULT_LIMIT, HISTORY_DEFAULT_KEYFRAME_INTERVAL
 from chess.chess_enums import MoveCode, PieceColor, PieceType
+from chess.chess_moves import get_move_code, get_move_from, get_move_to, set_promotion_type, get_move_string
 
 GUI_CONFIG_ENGINE_TITLE = "Anchovy v0.1" 
 GUI_CONFIG_TILE_SIZE = 4
@@ -12,32 +19,52 @@ GUI_CONFIG_AVAILABLE_SQUARE_COLOR = "#b9ce59"
 
 # GUI_CONFIG_AVAILABLE_DARK_SQUARE_COLOR = "#008000"
 
+GUI_CONFIG_SEARCH_TIME = 2.0
+# milliseconds between two looks at the progress of a background search
+GUI_CONFIG_SEARCH_POLL_INTERVAL = 50
+# positions whose legal moves are kept, clicks and undo/redo keep asking for the same few positions
+GUI_CONFIG_MOVE_CACHE_SIZE = 1024
+
 GUI_CONFIG_BOARD_CANVAS_WIDTH = 640
 GUI_CONFIG_BOARD_CANVAS_HEIGHT = 640
 
 class GUI():
 
-	def __init__(self, board):
+	def __init__(self, board, search_engine = None):
 		
 		self.window = tk.Tk()
 		self.window.title(GUI_CONFIG_ENGINE_TITLE)
 
 		self.board = board
+		self.board.set_move_cache(MoveCache(GUI_CONFIG_MOVE_CACHE_SIZE))
+		self.board.set_history_limits(HISTORY_DEFAULT_LIMIT, HISTORY_DEFAULT_KEYFRAME_INTERVAL)
+		self.search_engine = search_engine if search_engine is not None else chess_search.SearchEngine(max_time = GUI_CONFIG_SEARCH_TIME)
 
 		self.board_canvas = tk.Canvas(self.window, width = GUI_CONFIG_BOARD_CANVAS_WIDTH, height = GUI_CONFIG_BOARD_CANVAS_HEIGHT)
 		self.board_canvas.grid(row = 0, column = 0)
 
+		self.status_label = tk.Label(self.window, text = "", anchor = "w")
+		self.status_label.grid(row = 1, column = 0, sticky = "we")
+
 		
 		self.tile_width = GUI_CONFIG_BOARD_CANVAS_WIDTH / (self.board.board_width + 1)
 		self.tile_height = GUI_CONFIG_BOARD_CANVAS_HEIGHT / (self.board.board_height + 1)
 		
-		self.piece_images = []
-		self.piece_views = []
+		# sprites are loaded once per piece type and color
+		self.piece_sprites = {}
+		# canvas item and sprite key of every rendered piece by canvas tile, render_board only touches the tiles that changed
+		self.piece_views = {}
 		self.tile_views = []
 		self.highlighted_tile_views = []
 		
 		self.available_moves = {}
 
+		# the engine thinks on a copy of the board in a worker thread and reports through search_queue
+		# every search gets a new id so the messages of a cancelled search are told apart and dropped
+		self.search_thread = None
+		self.search_queue = queue.Queue()
+		self.search_id = 0
+
 		self.draw_board()
 		self.render_board()
 
@@ -49,8 +76,8 @@ class GUI():
 	
 	def highlight_move(self, move):
 		if move is not None:
-			from_x, from_y = move[3], move[4]
-			to_x, to_y = move[5], move[6]
+			from_x, from_y = get_move_from(move)
+			to_x, to_y = get_move_to(move)
 
 			from_x,from_y = self.board.board_width-from_y-1,from_x
 			to_x,to_y = self.board.board_width-to_y-1,to_x
@@ -69,9 +96,63 @@ class GUI():
 		else:
 			self.clear_highlighted_tiles()
 
+	def is_searching(self):
+		return self.search_thread is not None and self.search_thread.is_alive()
+
+	def run_search(self, search_id, board):
+		result = self.search_engine.search(board, lambda result: self.search_queue.put((search_id, False, result)), reset_stop = False)
+		self.search_queue.put((search_id, True, result))
+
+	# Starts the engine on a copy of the position, the best move is played once the search ends
+	def start_search(self):
+		self.cancel_search()
+		self.search_id += 1
+		self.search_engine.stopped = False
+		self.search_thread = threading.Thread(target = self.run_search, args = (self.search_id, copy.deepcopy(self.board)), daemon = True)
+		self.search_thread.start()
+		self.status_label.config(text = "Thinking...")
+		self.window.after(GUI_CONFIG_SEARCH_POLL_INTERVAL, self.poll_search, self.search_id)
+
+	# Stops a running search without playing its move, called before anything changes the position
+	def cancel_search(self):
+		if self.search_thread is None:
+			return
+		self.search_id += 1
+		self.search_engine.stop()
+		# the engine is shared with the next search, it stops within a few hundred nodes
+		self.search_thread.join()
+		self.search_thread = None
+		self.status_label.config(text = "")
+
+	def poll_search(self, polled_search_id):
+		while True:
+			try:
+				search_id, finished, result = self.search_queue.get_nowait()
+			except queue.Empty:
+				break
+			if search_id != self.search_id:
+				continue
+
+			if result is not None:
+				best_move = get_move_string(result.best_move) if result.best_move is not None else "-"
+				self.status_label.config(text = f"depth {result.depth}  best {best_move}  nps {result.get_nps():.0f}")
+
+			if finished:
+				self.search_thread = None
+				if result is not None and result.best_move is not None:
+					self.board.make_move(result.best_move)
+					self.highlight_move(self.board.get_last_move())
+					self.render_board()
+				return
+
+		# a cancelled search leaves the polling to the search that replaced it
+		if self.search_thread is not None and polled_search_id == self.search_id:
+			self.window.after(GUI_CONFIG_SEARCH_POLL_INTERVAL, self.poll_search, polled_search_id)
+
 	def on_key_press(self, event):
 		
 		if event.char == "r":
+			self.cancel_search()
 			legal_moves = self.board.get_legal_moves(self.board.get_turn_color())
 			
 			if len(legal_moves) == 0:
@@ -82,33 +163,44 @@ class GUI():
 			self.highlight_move(self.board.get_last_move())
 			self.render_board()
 
+		if event.char == "e":
+			# a second press makes the engine play the best move it has found so far
+			if self.is_searching():
+				self.search_engine.stop()
+			else:
+				self.start_search()
+
 		if event.char == 'u':
+			self.cancel_search()
 
 			self.highlight_move(self.board.get_last_move())
 			self.board.undo_last_move()
 			self.render_board()
 
 		if event.char == 'n':
+			self.cancel_search()
 
 			self.highlight_move(self.board.get_retrieve_move())
 			self.board.retrieve_next_move()
 			self.render_board()
 
 		if event.char == 'd':
+			self.cancel_search()
 			self.board.reset_board()
 			self.render_board()
 			self.highlight_move(None)
 
 		if event.char == 'q':
+			self.cancel_search()
 			self.window.destroy()
 
 		if event.char == 'c':
 			print("Number of legal moves:", len(self.board.get_legal_moves(self.board.get_turn_color())))
+			print("Move cache:", self.board.move_cache.get_stats())
 
 
 	def promote_move(self, move, promotion):
-		move[7] = promotion
-		self.board.make_move(move)
+		self.board.make_move(set_promotion_type(move, promotion))
 		self.promotion_window.destroy()
 
 	def tile_on_click(self, tile_id):
@@ -116,7 +208,8 @@ class GUI():
 
 		if len(self.available_moves.keys()) != 0 and tile_id in self.available_moves.keys():
 			move = self.available_moves[tile_id]
-			if move[0] == MoveCode.PROMOTION_CODE:
+			self.cancel_search()
+			if get_move_code(move) == MoveCode.PROMOTION_CODE:
 				# create 4 button for each promotion piece
 				self.promotion_window = tk.Toplevel(self.window)
 				self.promotion_window.title("Promote to")
@@ -145,9 +238,9 @@ class GUI():
 		else:
 			piece = self.board.get_piece(board_x, board_y)
 			if piece is not None and piece.color == self.board.get_turn_color():
-				legal_moves = piece.get_legal_moves(self.board)
+				legal_moves = [move for move in self.board.get_legal_moves(piece.color) if get_move_from(move) == (board_x, board_y)]
 				for move in legal_moves:
-					target_square = move[5], move[6]
+					target_square = get_move_to(move)
 					tile = self.board.board_width - target_square[1] - 1 + target_square[0] * self.board.board_width
 					highlighted_color = GUI_CONFIG_AVAILABLE_SQUARE_COLOR
 					self.board_canvas.itemconfig(self.tile_views[tile], fill=highlighted_color)
@@ -206,26 +299,37 @@ class GUI():
 		self.window.mainloop()
 		# Bind button R
 
+	def get_piece_sprite(self, piece):
+		sprite_key = (piece.type, piece.color)
+		if sprite_key not in self.piece_sprites:
+			fen_char = piece.fen_char().lower()
+			color_char = piece.color_char()
+			piece_image_path = f"assets/sprites/chess_pieces/chess_piece_{fen_char}{color_char}.png"
+			self.piece_sprites[sprite_key] = tk.PhotoImage(file = piece_image_path)
+		return self.piece_sprites[sprite_key]
+
 	def render_board(self):
 
-		# Clear the board
-		for piece_view in self.piece_views:
-			self.board_canvas.delete(piece_view)
-		self.piece_views = []
-		
 		for i in range(self.board.board_width):
 			for j in range(self.board.board_height):
 				pos_x, pos_y = i, self.board.board_height - j - 1
-				if self.board.get_piece(pos_x, pos_y) is not None:
-					piece = self.board.get_piece(pos_x, pos_y)
-					fen_char = piece.fen_char().lower()
-					color_char = piece.color_char()
-					piece_image_path = f"assets/sprites/chess_pieces/chess_piece_{fen_char}{color_char}.png"
-					
-					piece_image = tk.PhotoImage(file = piece_image_path)
-					self.piece_images.append(piece_image)
-					piece_view = self.board_canvas.create_image((i + 0.5) * self.tile_width, (j + 0.5) * self.tile_height, image = piece_image)
-					self.piece_views.append(piece_view)
+				piece = self.board.get_piece(pos_x, pos_y)
+				sprite_key = (piece.type, piece.color) if piece is not None else None
+				piece_view = self.piece_views.get((i, j))
+				rendered_key = piece_view[1] if piece_view is not None else None
+
+				if rendered_key == sprite_key:
+					continue
+
+				if piece is None:
+					self.board_canvas.delete(piece_view[0])
+					del self.piece_views[(i, j)]
+				elif piece_view is not None:
+					self.board_canvas.itemconfig(piece_view[0], image = self.get_piece_sprite(piece))
+					self.piece_views[(i, j)] = (piece_view[0], sprite_key)
+				else:
+					piece_item = self.board_canvas.create_image((i + 0.5) * self.tile_width, (j + 0.5) * self.tile_height, image = self.get_piece_sprite(piece))
+					self.piece_views[(i, j)] = (piece_item, sprite_key)
 
 
 	def draw_board(self):
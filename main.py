@@ -2,12 +2,19 @@ import gym
 import numpy as np
 import argparse
 import chess.chess_board as chess_board
+import chess.chess_search as chess_search
+from chess.chess_transposition import TranspositionTable
 from chess.chess_enums import PieceColor, PieceType, MoveCode
+from chess.chess_moves import get_move_string
+import chess.chess_selfplay as chess_selfplay
+import chess.utilities.polyglot as polyglot
+import chess.chess_tablebase as chess_tablebase
 import gui
 
-def run_cli():
+def run_cli(search_engine):
 
 	board = chess_board.ChessBoard()
+	board.set_history_limits(chess_board.HISTORY_DEFAULT_LIMIT, chess_board.HISTORY_DEFAULT_KEYFRAME_INTERVAL)
 	board.display_board()
 	simulate = False
 	while True:
@@ -23,19 +30,47 @@ def run_cli():
 			random_move = legal_moves[np.random.randint(len(legal_moves))]
 			# print("Move Played : ", random_move)
 
-			
-			# last_move = board.get_last_move()
-			# if last_move is not None:
-			# 	last_move_code, last_moved_color, last_moved_type, last_moved_from_x, last_moved_from_y, last_moved_to_x, last_moved_to_y = last_move[0:7]
-			# 	print(f"Last move {last_move_code} {board.get_coordinate_string(last_moved_from_x, last_moved_from_y)} {board.get_coordinate_string(last_moved_to_x, last_moved_to_y)}")
-
 			board.make_move(random_move)
 			board.display_board()
+		elif command == "e":
+			result = search_engine.search(board, print)
+			if result is not None and result.best_move is not None:
+				board.make_move(result.best_move)
+				board.display_board()
+		elif command != "s":
+			# coordinate moves such as e2e4 or b7a8q
+			legal_moves = {get_move_string(move): move for move in board.get_legal_moves(board.get_turn_color())}
+			if command in legal_moves:
+				board.make_move(legal_moves[command])
+				board.display_board()
 		
-def run_gui():
+def run_selfplay(args):
+
+	settings = chess_selfplay.SelfPlaySettings(args.policy, args.max_moves, seed = args.seed, depth = args.depth, move_time = args.time, nodes = args.nodes, hash_mb = args.hash, book_path = args.book, tablebase_path = args.tablebases)
+	stats = chess_selfplay.run_selfplay(args.games, args.workers, settings, args.output, pgn_path = args.pgn)
+	print(f"{stats['games']} games, {stats['moves']} moves in {stats['elapsed']:.1f}s ({stats['games_per_second']:.1f} games/s) results {stats['results']}")
+
+def run_build_book(args):
+
+	if args.book is None or args.corpus is None:
+		raise Exception("Building a book needs --book and --corpus")
+	builder = polyglot.BookBuilder(args.book_plies)
+	for path in args.corpus:
+		builder.add_file(path)
+	builder.write(args.book)
+	print(f"{len(builder.counts)} book entries written to {args.book}")
+
+def run_build_tablebases(args):
+
+	if args.tablebases is None:
+		raise Exception("Building tablebases needs --tablebases")
+	for stats in chess_tablebase.generate_tablebases(args.tablebases, workers = args.workers):
+		print(f"{stats['name']} {stats['wins']} wins, {stats['losses']} losses, longest mate {stats['longest_mate']} plies in {stats['elapsed']:.1f}s")
+
+def run_gui(search_engine):
 
 	board = chess_board.ChessBoard()	
-	chess_gui = gui.GUI(board)
+	chess_gui = gui.GUI(board, search_engine)
 	chess_gui.run()
 
 
@@ -43,12 +78,36 @@ if __name__ == "__main__":
 
 	parser = argparse.ArgumentParser(description='Process some integers.')
 	parser.add_argument("-v", "--visualize", action="store")
+	parser.add_argument("--depth", type=int, default=64, help="maximum search depth of the engine")
+	parser.add_argument("--time", type=float, default=2.0, help="seconds the engine may think per move")
+	parser.add_argument("--nodes", type=int, default=None, help="nodes the engine may search per move")
+	parser.add_argument("--hash", type=float, default=16, help="transposition table size in MB")
+	parser.add_argument("--games", type=int, default=100, help="number of self-play games")
+	parser.add_argument("--workers", type=int, default=None, help="self-play worker processes, all cores by default")
+	parser.add_argument("--policy", choices=chess_selfplay.SELFPLAY_POLICIES, default="random", help="self-play move policy")
+	parser.add_argument("--output", default="selfplay.jsonl", help="file the self-play games are appended to")
+	parser.add_argument("--pgn", default=None, help="file the self-play games are also appended to as PGN")
+	parser.add_argument("--max-moves", type=int, default=chess_selfplay.DEFAULT_MAX_MOVES, help="plies after which a self-play game is cut off")
+	parser.add_argument("--seed", type=int, default=0, help="seed of the self-play random policy")
+	parser.add_argument("--book", default=None, help="Polyglot opening book self-play draws its first moves from, or the book -v book writes")
+	parser.add_argument("--corpus", nargs="+", default=None, help="PGN or self-play JSON lines files -v book builds the book from")
+	parser.add_argument("--book-plies", type=int, default=polyglot.BOOK_DEFAULT_MAX_PLIES, help="plies of every corpus game that go into the book")
+	parser.add_argument("--tablebases", default=None, help="directory of the endgame tables the engine probes, or the tables -v tablebase writes")
 	args = parser.parse_args()
 
+	tablebase = chess_tablebase.Tablebase(args.tablebases) if args.tablebases is not None else None
+	search_engine = chess_search.SearchEngine(args.depth, args.time, args.nodes, TranspositionTable(args.hash), tablebase)
+
 	if args.visualize == "gui":
-		run_gui()
+		run_gui(search_engine)
 	elif args.visualize == "cli":
-		run_cli()
+		run_cli(search_engine)
+	elif args.visualize == "selfplay":
+		run_selfplay(args)
+	elif args.visualize == "book":
+		run_build_book(args)
+	elif args.visualize == "tablebase":
+		run_build_tablebases(args)
 	else:
-		run_gui()
+		run_gui(search_engine)
 
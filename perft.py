@@ -0,0 +1,134 @@
+import argparse
+import json
+import sys
+import time
+import chess.chess_board as chess_board
+from chess.chess_transposition import TranspositionTable
+import chess.utilities.fen as fen
+
+# Standard perft reference positions with their known node counts per depth, starting at depth 1
+PERFT_SUITE = [
+	{
+		"name": "initial",
+		"fen": fen.FEN_DEFAULT,
+		"nodes": [20, 400, 8902, 197281, 4865609, 119060324],
+	},
+	{
+		"name": "kiwipete",
+		"fen": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+		"nodes": [48, 2039, 97862, 4085603, 193690690],
+	},
+	{
+		"name": "position3",
+		"fen": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+		"nodes": [14, 191, 2812, 43238, 674624, 11030083],
+	},
+	{
+		"name": "position4",
+		"fen": "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+		"nodes": [6, 264, 9467, 422333, 15833292],
+	},
+	{
+		"name": "position5",
+		"fen": "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+		"nodes": [44, 1486, 62379, 2103487, 89941194],
+	},
+	{
+		"name": "position6",
+		"fen": "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+		"nodes": [46, 2079, 89890, 3894594, 164075551],
+	},
+]
+
+# Runs perft on every position for depths 1..max_depth and returns one result per position and depth
+def run_suite(positions, max_depth, verbose = True, transposition_table = None):
+
+	board = chess_board.ChessBoard()
+	results = []
+
+	for position in positions:
+		fen.load_fen_to_board(board, position["fen"])
+		expected_nodes = position.get("nodes", [])
+
+		for depth in range(1, max_depth + 1):
+			start_time = time.perf_counter()
+			nodes = board.perft(depth, transposition_table)
+			elapsed = time.perf_counter() - start_time
+
+			expected = expected_nodes[depth - 1] if depth <= len(expected_nodes) else None
+			result = {
+				"name": position["name"],
+				"fen": position["fen"],
+				"depth": depth,
+				"nodes": nodes,
+				"expected": expected,
+				"passed": expected is None or nodes == expected,
+				"seconds": elapsed,
+				"nps": nodes / elapsed if elapsed > 0 else 0.0,
+			}
+			results.append(result)
+
+			if verbose:
+				status = "-" if expected is None else ("OK" if result["passed"] else f"FAIL (expected {expected})")
+				print(f"{position['name']:<12} depth {depth}  nodes {nodes:>10}  {elapsed:8.3f}s  {result['nps']:>10.0f} nps  {status}")
+
+	return results
+
+def run_divide(position_fen, depth, transposition_table = None):
+
+	board = chess_board.ChessBoard()
+	fen.load_fen_to_board(board, position_fen)
+
+	move_nodes = board.divide(depth, transposition_table)
+	for move_string in sorted(move_nodes):
+		print(f"{move_string}: {move_nodes[move_string]}")
+	print(f"Moves: {len(move_nodes)}")
+	print(f"Nodes: {sum(move_nodes.values())}")
+	return move_nodes
+
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(description='Measure move generator speed and correctness with perft.')
+	parser.add_argument("-d", "--depth", type=int, default=3, help="maximum perft depth")
+	parser.add_argument("-p", "--position", action="append", help="only run the named suite position, can be repeated")
+	parser.add_argument("-f", "--fen", help="run a custom position instead of the suite")
+	parser.add_argument("--divide", action="store_true", help="print the node count below every root move")
+	parser.add_argument("--json", help="write the results as JSON to this path, - for stdout")
+	parser.add_argument("--hash", type=float, default=0, help="transposition table size in MB, 0 disables it")
+	args = parser.parse_args()
+
+	transposition_table = TranspositionTable(args.hash) if args.hash > 0 else None
+
+	if args.divide:
+		run_divide(args.fen if args.fen is not None else fen.FEN_DEFAULT, args.depth, transposition_table)
+		sys.exit(0)
+
+	if args.fen is not None:
+		positions = [{"name": "custom", "fen": args.fen}]
+	else:
+		positions = [position for position in PERFT_SUITE if args.position is None or position["name"] in args.position]
+
+	results = run_suite(positions, args.depth, args.json != "-", transposition_table)
+	if transposition_table is not None and args.json != "-":
+		print(f"Transposition table: {transposition_table.get_stats()}")
+
+	if args.json is not None:
+		total_nodes = sum(result["nodes"] for result in results)
+		total_seconds = sum(result["seconds"] for result in results)
+		report = {
+			"results": results,
+			"total_nodes": total_nodes,
+			"total_seconds": total_seconds,
+			"nps": total_nodes / total_seconds if total_seconds > 0 else 0.0,
+			"passed": all(result["passed"] for result in results),
+		}
+		if transposition_table is not None:
+			report["transposition_table"] = transposition_table.get_stats()
+		if args.json == "-":
+			print(json.dumps(report, indent=4))
+		else:
+			with open(args.json, "w") as json_file:
+				json.dump(report, json_file, indent=4)
+
+	sys.exit(0 if all(result["passed"] for result in results) else 1)